@@ -0,0 +1,5 @@
+import sys
+
+from protobuf_decoder.cli import main
+
+sys.exit(main())
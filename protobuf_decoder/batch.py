@@ -0,0 +1,174 @@
+"""
+Decode many messages in worker processes that read them from shared memory.
+
+The messages are copied once into a `multiprocessing.shared_memory` block, workers receive only
+(offset, length) spans and send back each result in a compact serialized form.
+"""
+from __future__ import annotations
+import marshal
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Sequence, Tuple, Union
+
+from protobuf_decoder.protobuf_decoder import FixedBitsValue, LazyString, Parser, ParsedResult, ParsedResults
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python 3.7, only jobs=1 is supported
+    shared_memory = None
+
+VARINT, FIXED64, FIXED32, STRING, LAZY_STRING, NESTED = range(6)
+WIRE_TYPES = {
+    VARINT: "varint",
+    FIXED64: "fixed64",
+    FIXED32: "fixed32",
+    STRING: "string",
+    LAZY_STRING: "string",
+    NESTED: "length_delimited",
+}
+
+
+def _serialize_result(result: ParsedResult, node_index: dict) -> tuple:
+    data = result.data
+    if isinstance(data, ParsedResults):
+        record = (result.field, NESTED, node_index[id(data)])
+    elif isinstance(data, FixedBitsValue):
+        record = (result.field, FIXED64 if result.wire_type == "fixed64" else FIXED32, data.unsigned_int)
+    elif isinstance(data, LazyString):
+        record = (result.field, LAZY_STRING, data.bytes)
+    elif result.wire_type == "varint":
+        record = (result.field, VARINT, data)
+    elif result.wire_type == "string":
+        record = (result.field, STRING, data)
+    else:
+        raise ValueError(f"Cannot serialize {data.__class__.__name__} as {result.wire_type}")
+
+    if result.has_offsets:
+        record += (result.offset, result.value_offset, result.value_length)
+    return record
+
+
+def serialize(parsed_results: ParsedResults) -> bytes:
+    """
+    Serialize a decoded tree with `marshal` as a flat list of messages, children before their parents.
+
+    Nested messages refer to their position in the list, so the depth of the tree doesn't matter
+    and subtrees shared by `Parser(memoize_subtrees=True)` are stored once.
+    """
+    nodes = []
+    node_index = {}
+    stack = [(parsed_results, False)]
+    while stack:
+        node, is_expanded = stack.pop()
+        if id(node) in node_index:
+            continue
+        if not is_expanded:
+            stack.append((node, True))
+            stack.extend(
+                (result.data, False) for result in node.results
+                if isinstance(result.data, ParsedResults) and id(result.data) not in node_index
+            )
+            continue
+
+        records = tuple(_serialize_result(result, node_index) for result in node.results)
+        node_index[id(node)] = len(nodes)
+        nodes.append((records, node.remain_data, node.skipped_ranges))
+    return marshal.dumps(nodes)
+
+
+def deserialize(data: bytes) -> ParsedResults:
+    built = []
+    for records, remain_data, skipped_ranges in marshal.loads(data):
+        results = []
+        for record in records:
+            field, code, value = record[:3]
+            if code == NESTED:
+                value = built[value]
+            elif code == FIXED64:
+                value = FixedBitsValue(bit_value=value, bits=64)
+            elif code == FIXED32:
+                value = FixedBitsValue(bit_value=value, bits=32)
+            elif code == LAZY_STRING:
+                value = LazyString(value)
+            results.append(ParsedResult(field, WIRE_TYPES[code], value, *record[3:]))
+        built.append(ParsedResults(results=results, remain_data=remain_data, skipped_ranges=skipped_ranges))
+    return built[-1]
+
+
+# set in each worker process by `_init_worker`
+_worker_memory = None
+_worker_parser = None
+
+
+def _init_worker(name: str, parser_options: dict):
+    global _worker_memory, _worker_parser
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    _worker_parser = Parser(**parser_options)
+
+
+def _decode_span(span: Tuple[int, int]) -> bytes:
+    offset, length = span
+    return serialize(_worker_parser.parse_bytes(_worker_memory.buf[offset:offset + length]))
+
+
+def _decode_shared(fill, size: int, spans: Sequence[Tuple[int, int]], jobs: int, chunksize: int,
+                   parser_options: dict) -> Iterator[ParsedResults]:
+    if shared_memory is None:
+        raise ImportError("decoding in worker processes requires multiprocessing.shared_memory (Python 3.8+), "
+                          "use jobs=1")
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        fill(memory.buf)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(memory.name, parser_options)) as executor:
+            for serialized in executor.map(_decode_span, spans, chunksize=chunksize):
+                yield deserialize(serialized)
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def decode_spans(buffer: Union[bytes, bytearray, memoryview], spans: Sequence[Tuple[int, int]], jobs: int = None,
+                 chunksize: int = 64, **parser_options) -> Iterator[ParsedResults]:
+    """
+    Decode the messages at the (offset, length) `spans` of `buffer` with `jobs` worker processes.
+
+    Results are yielded in the order of `spans`, `parser_options` are passed to each worker's `Parser`.
+    With `jobs=1` the messages are decoded in this process from memoryview slices of `buffer`, other values
+    require Python 3.8 or later.
+    """
+    if jobs == 1:
+        parser = Parser(**parser_options)
+        view = memoryview(buffer)
+        for offset, length in spans:
+            yield parser.parse_bytes(view[offset:offset + length])
+        return
+
+    def fill(memory_buffer):
+        memory_buffer[:len(buffer)] = buffer
+
+    yield from _decode_shared(fill, len(buffer), spans, jobs, chunksize, parser_options)
+
+
+def decode_batch(messages: Sequence[Union[bytes, bytearray, memoryview]], jobs: int = None, chunksize: int = 64,
+                 **parser_options) -> List[ParsedResults]:
+    """
+    Decode a batch of messages with `jobs` worker processes, returns the results in order.
+
+    `jobs=1` decodes in this process, other values require Python 3.8 or later.
+    """
+    if jobs == 1:
+        parser = Parser(**parser_options)
+        return [parser.parse_bytes(message) for message in messages]
+
+    spans = []
+    offset = 0
+    for message in messages:
+        spans.append((offset, len(message)))
+        offset += len(message)
+
+    def fill(memory_buffer):
+        for (start, length), message in zip(spans, messages):
+            memory_buffer[start:start + length] = message
+
+    return list(_decode_shared(fill, offset, spans, jobs, chunksize, parser_options))
@@ -0,0 +1,302 @@
+"""
+Benchmarks for the decoder on a deterministic synthetic corpus.
+
+    python -m protobuf_decoder.benchmark --repeat 20 --json result.json
+"""
+from __future__ import annotations
+import argparse
+import base64
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from protobuf_decoder.protobuf_decoder import Parser, ParsedResults, Utils
+
+SHAPES = ("wide_flat", "deep_nested", "huge_strings", "many_fixed64", "packed_arrays", "random_garbage")
+INPUT_FORMATS = ("hex", "hex_colon", "hex_0x", "base64", "xxd", "hexdump")
+
+
+def _tag(field: int, wire_type: int) -> bytes:
+    return Utils.encode_varint(field << 3 | wire_type)
+
+
+def _length_delimited(field: int, payload: bytes) -> bytes:
+    return _tag(field, 2) + Utils.encode_varint(len(payload)) + payload
+
+
+def _text(rnd: random.Random, length: int) -> bytes:
+    return bytes(rnd.randrange(0x20, 0x7F) for _ in range(length))
+
+
+def generate_wide_flat(rnd: random.Random, scale: int) -> bytes:
+    message = bytearray()
+    for field in range(1, 1000 * scale + 1):
+        if field % 3:
+            message += _tag(field % 2000 + 1, 0) + Utils.encode_varint(rnd.getrandbits(rnd.choice((7, 14, 32, 63))))
+        else:
+            message += _length_delimited(field % 2000 + 1, _text(rnd, rnd.randrange(4, 32)))
+    return bytes(message)
+
+
+def generate_deep_nested(rnd: random.Random, scale: int) -> bytes:
+    message = _tag(1, 0) + Utils.encode_varint(rnd.getrandbits(32)) + _length_delimited(2, _text(rnd, 8))
+    for _ in range(200 * scale):
+        message = _tag(3, 0) + Utils.encode_varint(rnd.getrandbits(16)) + _length_delimited(1, message)
+    return message
+
+
+def generate_huge_strings(rnd: random.Random, scale: int) -> bytes:
+    message = bytearray()
+    for field in range(1, 5):
+        message += _length_delimited(field, _text(rnd, 64 * 1024 * scale))
+    return bytes(message)
+
+
+def generate_many_fixed64(rnd: random.Random, scale: int) -> bytes:
+    message = bytearray()
+    for _ in range(1000 * scale):
+        message += _tag(rnd.randrange(1, 16), 1) + rnd.getrandbits(64).to_bytes(8, "little")
+    return bytes(message)
+
+
+def generate_packed_arrays(rnd: random.Random, scale: int) -> bytes:
+    message = bytearray()
+    for field in range(1, 9):
+        packed = b"".join(Utils.encode_varint(rnd.getrandbits(rnd.choice((7, 14, 28)))) for _ in range(500 * scale))
+        message += _length_delimited(field, packed)
+    return bytes(message)
+
+
+def generate_random_garbage(rnd: random.Random, scale: int) -> bytes:
+    return bytes(rnd.getrandbits(8) for _ in range(16 * 1024 * scale))
+
+
+GENERATORS: Dict[str, Callable[[random.Random, int], bytes]] = {
+    "wide_flat": generate_wide_flat,
+    "deep_nested": generate_deep_nested,
+    "huge_strings": generate_huge_strings,
+    "many_fixed64": generate_many_fixed64,
+    "packed_arrays": generate_packed_arrays,
+    "random_garbage": generate_random_garbage,
+}
+
+
+def generate_corpus(seed: int = 0, scale: int = 1, shapes=SHAPES) -> Dict[str, bytes]:
+    """
+    Build one message per shape, the same seed always gives the same bytes.
+    """
+    return {shape: GENERATORS[shape](random.Random(f"{seed}:{shape}"), scale) for shape in shapes}
+
+
+def _spaced_hex(data: bytes, separator: str = " ", prefix: str = "") -> str:
+    hex_string = data.hex()
+    return separator.join(prefix + hex_string[idx:idx + 2] for idx in range(0, len(hex_string), 2))
+
+
+def format_xxd(data: bytes) -> str:
+    lines = []
+    for offset in range(0, len(data), 16):
+        row = data[offset:offset + 16]
+        hex_string = row.hex()
+        groups = " ".join(hex_string[idx:idx + 4] for idx in range(0, len(hex_string), 4))
+        text = "".join(chr(c) if 0x20 <= c < 0x7F else "." for c in row)
+        lines.append(f"{offset:08x}: {groups:<39}  {text}")
+    return "\n".join(lines) + "\n"
+
+
+def format_hexdump(data: bytes) -> str:
+    lines = []
+    for offset in range(0, len(data), 16):
+        row = data[offset:offset + 16]
+        columns = f"{_spaced_hex(row[:8])}  {_spaced_hex(row[8:])}"
+        text = "".join(chr(c) if 0x20 <= c < 0x7F else "." for c in row)
+        lines.append(f"{offset:08x}  {columns:<48}  |{text}|")
+    lines.append(f"{len(data):08x}")
+    return "\n".join(lines) + "\n"
+
+
+def _input_conversions(data: bytes) -> Dict[str, Callable[[], bytes]]:
+    """
+    Text form of `data` per input format and the function converting it back to bytes.
+    """
+    texts = dict(
+        hex=_spaced_hex(data),
+        hex_colon=_spaced_hex(data, separator=":"),
+        hex_0x=_spaced_hex(data, separator=", ", prefix="0x"),
+        base64=base64.b64encode(data).decode("ascii"),
+        xxd=format_xxd(data),
+        hexdump=format_hexdump(data),
+    )
+    return dict(
+        hex=lambda: bytes.fromhex(Utils.validate(texts["hex"])[1]),
+        hex_colon=lambda: Utils.hex_to_bytes(texts["hex_colon"]),
+        hex_0x=lambda: Utils.hex_to_bytes(texts["hex_0x"]),
+        base64=lambda: Utils.base64_to_bytes(texts["base64"]),
+        xxd=lambda: Utils.dump_to_bytes(texts["xxd"]),
+        hexdump=lambda: Utils.dump_to_bytes(texts["hexdump"]),
+    )
+
+
+def count_fields(parsed_results: ParsedResults) -> int:
+    count = 0
+    stack = [parsed_results]
+    while stack:
+        results = stack.pop().results
+        count += len(results)
+        stack.extend(result.data for result in results if isinstance(result.data, ParsedResults))
+    return count
+
+
+def _show_parsed_results(parsed_results: ParsedResults):
+    Utils.show_parsed_results(parsed_results, print_func=lambda *args: None)
+
+
+def _operations(message: bytes) -> Dict[str, Callable[[], object]]:
+    hex_string = message.hex()
+    parsed_results = Parser().parse(hex_string)
+    return {
+        "parse": lambda: Parser().parse(hex_string),
+        "to_dict": parsed_results.to_dict,
+        "show_parsed_results": lambda: _show_parsed_results(parsed_results),
+        "to_bytes": parsed_results.to_bytes,
+    }
+
+
+def percentile(sorted_values: List[float], ratio: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(ratio * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _peak_memory(func: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(func: Callable[[], object], size: int, fields: int, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+
+    total = sum(latencies)
+    latencies.sort()
+    return dict(
+        repeat=repeat,
+        bytes=size,
+        fields=fields,
+        mb_per_sec=size * repeat / total / 1e6 if total else None,
+        fields_per_sec=fields * repeat / total if total else None,
+        p50_ms=percentile(latencies, 0.5) * 1e3,
+        p90_ms=percentile(latencies, 0.9) * 1e3,
+        p99_ms=percentile(latencies, 0.99) * 1e3,
+        peak_memory_bytes=_peak_memory(func),
+    )
+
+
+def run_input_conversion(data: bytes, repeat: int = 10, input_formats=INPUT_FORMATS) -> List[dict]:
+    results = []
+    for input_format, func in _input_conversions(data).items():
+        if input_format not in input_formats:
+            continue
+        assert func() == data, f"{input_format} conversion is broken"
+        result = dict(input_format=input_format)
+        result.update(measure(func, len(data), 0, repeat))
+        results.append(result)
+    return results
+
+
+def run(seed: int = 0, scale: int = 1, repeat: int = 10, shapes=SHAPES, operations=None,
+        input_formats=INPUT_FORMATS) -> dict:
+    corpus = generate_corpus(seed=seed, scale=scale, shapes=shapes)
+    results = []
+    for shape, message in corpus.items():
+        fields = count_fields(Parser().parse(message.hex()))
+        for operation, func in _operations(message).items():
+            if operations and operation not in operations:
+                continue
+            result = dict(shape=shape, operation=operation)
+            result.update(measure(func, len(message), fields, repeat))
+            results.append(result)
+
+    input_conversion = run_input_conversion(b"".join(corpus.values()), repeat, input_formats) if input_formats else []
+
+    return dict(
+        meta=dict(
+            seed=seed,
+            scale=scale,
+            python=platform.python_version(),
+            implementation=platform.python_implementation(),
+            platform=platform.platform(),
+            timestamp=time.time(),
+        ),
+        results=results,
+        input_conversion=input_conversion,
+    )
+
+
+def format_report(report: dict) -> str:
+    header = f"{'shape':<16}{'operation':<22}{'bytes':>10}{'fields':>8}{'MB/s':>12}{'fields/s':>12}" \
+             f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'peak KiB':>10}"
+    lines = [header, "-" * len(header)]
+    for result in report["results"]:
+        lines.append(
+            f"{result['shape']:<16}{result['operation']:<22}{result['bytes']:>10}{result['fields']:>8}"
+            f"{result['mb_per_sec'] or 0:>12.3f}{result['fields_per_sec'] or 0:>12.0f}"
+            f"{result['p50_ms']:>10.3f}{result['p90_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+            f"{result['peak_memory_bytes'] / 1024:>10.1f}"
+        )
+
+    if report.get("input_conversion"):
+        header = f"{'input format':<16}{'bytes':>10}{'MB/s':>12}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'peak KiB':>10}"
+        lines += ["", header, "-" * len(header)]
+        for result in report["input_conversion"]:
+            lines.append(
+                f"{result['input_format']:<16}{result['bytes']:>10}{result['mb_per_sec'] or 0:>12.3f}"
+                f"{result['p50_ms']:>10.3f}{result['p90_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+                f"{result['peak_memory_bytes'] / 1024:>10.1f}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="python -m protobuf_decoder.benchmark", description=__doc__.strip())
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--scale", type=int, default=1, help="multiplies the size of every generated message")
+    arg_parser.add_argument("--repeat", type=int, default=10)
+    arg_parser.add_argument("--shape", action="append", choices=SHAPES, help="run only these shapes")
+    arg_parser.add_argument("--operation", action="append", help="run only these operations")
+    arg_parser.add_argument("--input-format", action="append", choices=INPUT_FORMATS,
+                            help="measure only these input conversions")
+    arg_parser.add_argument("--no-input-conversion", action="store_true", help="skip the input conversion benchmark")
+    arg_parser.add_argument("--json", metavar="PATH", help="write the machine-readable report to PATH ('-' for stdout)")
+    args = arg_parser.parse_args(argv)
+
+    input_formats = () if args.no_input_conversion else args.input_format or INPUT_FORMATS
+    report = run(seed=args.seed, scale=args.scale, repeat=args.repeat, shapes=args.shape or SHAPES,
+                 operations=args.operation, input_formats=input_formats)
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Decode protobuf messages from files or stdin.
+
+    protobuf-decoder message.hex
+    protobuf-decoder -f raw -o ndjson -j 4 --stats captures/*.bin
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from protobuf_decoder.protobuf_decoder import FieldPathParser, FixedBitsValue, GrpcFrameDecoder, LazyString, \
+    Parser, ParsedResults, TreeRenderer, Utils, write_decode_raw
+
+INPUT_FORMATS = ("hex", "base64", "dump", "raw", "delimited", "grpc")
+OUTPUT_FORMATS = ("json", "ndjson", "tree", "decode_raw", "flat")
+STDIN = "-"
+
+
+def read_input(path: str, input_format: str) -> List[bytes]:
+    """
+    Read one input and convert it to the bytes of the messages it contains.
+    """
+    if path == STDIN:
+        raw = sys.stdin.buffer.read()
+    else:
+        with open(path, "rb") as fp:
+            raw = fp.read()
+
+    if input_format == "raw":
+        return [raw]
+    if input_format == "delimited":
+        return list(Utils.split_delimited(raw))
+    if input_format == "grpc":
+        frames = GrpcFrameDecoder(decode_messages=False).decode(raw)
+        return [frame.payload for frame in frames if not frame.is_trailers]
+
+    text = raw.decode("utf-8")
+    if input_format == "hex":
+        return [Utils.hex_to_bytes(text)]
+    if input_format == "base64":
+        return [Utils.base64_to_bytes(text)]
+    if input_format == "dump":
+        return [Utils.dump_to_bytes(text)]
+    raise ValueError(f"Unsupported input format: {input_format}")
+
+
+def render(parsed_results: ParsedResults, output_format: str, renderer: TreeRenderer = None) -> str:
+    if output_format == "json":
+        return json.dumps(parsed_results.to_dict(), ensure_ascii=False, indent=2)
+    if output_format == "ndjson":
+        return json.dumps(parsed_results.to_dict(), ensure_ascii=False)
+    if output_format == "tree":
+        stream = io.StringIO()
+        (renderer or TreeRenderer()).render(parsed_results, stream)
+        return stream.getvalue().rstrip("\n")
+    raise ValueError(f"Unsupported output format: {output_format}")
+
+
+def _flat_value_to_json(value):
+    if isinstance(value, FixedBitsValue):
+        return value.to_dict()
+    if isinstance(value, LazyString):
+        return str(value)
+    if isinstance(value, bytes):
+        # left over bytes, as in the remain_data of to_dict()
+        return Utils.bytes_to_hex_string(value)
+    raise TypeError(f"{value.__class__.__name__} is not JSON serializable")
+
+
+def render_flat(flat: dict) -> str:
+    return json.dumps(flat, ensure_ascii=False, default=_flat_value_to_json)
+
+
+def render_decode_raw(message: bytes) -> str:
+    stream = io.StringIO()
+    write_decode_raw(message, stream)
+    return stream.getvalue().rstrip("\n")
+
+
+def decode_input(task: Tuple[str, str, str, bool, bool, tuple]) -> Tuple[List[str], int, str]:
+    """
+    Decode and render every message of one input, runs in a worker process when jobs > 1.
+
+    Returns the rendered messages, the number of decoded bytes and an error message if any.
+    """
+    path, input_format, output_format, strict, recover, limits = task
+    outputs = []
+    size = 0
+    try:
+        if output_format == "flat":
+            parser = FieldPathParser(strict=strict, recover=recover)
+        elif output_format != "decode_raw":
+            # the tree renderer only decodes the part of each string it shows
+            parser = Parser(strict=strict, lazy_strings=output_format == "tree", recover=recover)
+        renderer = TreeRenderer(*limits)
+        for message in read_input(path, input_format):
+            if output_format == "decode_raw":
+                outputs.append(render_decode_raw(message))
+            elif output_format == "flat":
+                outputs.append(render_flat(parser.parse_flat(message)))
+            else:
+                outputs.append(render(parser.parse_bytes(message), output_format, renderer))
+            size += len(message)
+    except (OSError, ValueError, AssertionError) as error:
+        return outputs, size, f"{path}: {error}"
+    return outputs, size, None
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    arg_parser = argparse.ArgumentParser(prog="protobuf-decoder", description="Decode protobuf without proto file")
+    arg_parser.add_argument("files", nargs="*", default=[STDIN], help="input files, '-' or nothing for stdin")
+    arg_parser.add_argument("-f", "--input-format", choices=INPUT_FORMATS, default="hex",
+                            help="hex text, base64 text, xxd/hexdump -C output, raw bytes, "
+                                 "raw varint length-delimited messages or gRPC frames (default: hex)")
+    arg_parser.add_argument("-o", "--output", choices=OUTPUT_FORMATS, default="json", help="default: json")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes")
+    arg_parser.add_argument("--max-string-length", type=int, metavar="N", help="tree: truncate longer strings")
+    arg_parser.add_argument("--max-repeated", type=int, metavar="N",
+                            help="tree: show only the first N occurrences of a field per message")
+    arg_parser.add_argument("--max-depth", type=int, metavar="N", help="tree: don't expand deeper nested messages")
+    arg_parser.add_argument("--strict", action="store_true", help="fail on input that is not fully decoded")
+    arg_parser.add_argument("--recover", action="store_true",
+                            help="skip corrupted top-level fields and continue at the next plausible field")
+    arg_parser.add_argument("--stats", action="store_true", help="report throughput on stderr")
+    return arg_parser
+
+
+def main(argv=None) -> int:
+    arg_parser = build_arg_parser()
+    args = arg_parser.parse_args(argv)
+    if args.jobs < 1:
+        arg_parser.error("--jobs must be positive")
+    if args.strict and args.recover:
+        arg_parser.error("--strict can't be used with --recover")
+
+    limits = (args.max_string_length, args.max_repeated, args.max_depth)
+    tasks = [(path, args.input_format, args.output, args.strict, args.recover, limits) for path in args.files]
+    started = time.perf_counter()
+
+    total_size = 0
+    total_messages = 0
+    exit_code = 0
+    out = sys.stdout
+    if args.jobs == 1 or len(tasks) == 1:
+        decoded_inputs = map(decode_input, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=args.jobs)
+        # map() yields in input order, so the output order doesn't depend on which worker finishes first
+        decoded_inputs = executor.map(decode_input, tasks)
+
+    try:
+        for outputs, size, error in decoded_inputs:
+            for output in outputs:
+                out.write(output)
+                out.write("\n")
+            total_size += size
+            total_messages += len(outputs)
+            if error is not None:
+                print(f"protobuf-decoder: {error}", file=sys.stderr)
+                exit_code = 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    out.flush()
+    if args.stats:
+        elapsed = time.perf_counter() - started
+        print(
+            f"protobuf-decoder: {len(tasks)} inputs, {total_messages} messages, {total_size} bytes "
+            f"in {elapsed:.3f}s ({total_size / elapsed / 1e6:.3f} MB/s, {total_messages / elapsed:.1f} messages/s)",
+            file=sys.stderr,
+        )
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Decode many messages straight into one column of values per field path.
+
+Values are collected while decoding with `FieldPathParser`, no `ParsedResults` tree is built for a message.
+"""
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, Sequence, Union
+
+from protobuf_decoder.protobuf_decoder import FieldPathParser, FixedBitsValue
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the raw bits of fixed values are collected as unsigned ints and reinterpreted as floats
+FIXED_TYPECODES = {"fixed64": ("Q", "d"), "fixed32": ("I", "f")}
+NUMPY_DTYPES = {"Q": "uint64", "d": "float64", "f": "float32"}
+
+
+@dataclass
+class Column:
+    """
+    Values of one field path across a batch, `rows[i]` is the index of the message `values[i]` came from.
+
+    A message without the field has no entry and a repeated field has one entry per occurrence, so `rows`
+    is ascending but neither dense nor unique. Varints are unsigned 64-bit ints, fixed64/fixed32 are doubles and
+    floats, strings and the bytes left over in messages ("remain_data", see `FieldPathParser`) stay in a list.
+    `wire_type` is None when several wire types share the path, the values are then a list of Python values.
+    """
+    wire_type: Union[str, None]
+    rows: Sequence[int]
+    values: Sequence
+    row_count: int
+
+    def to_list(self) -> list:
+        """
+        One entry per message: None when the field is missing, the value, or a list when it's repeated.
+        """
+        entries = [None] * self.row_count
+        repeated = set()
+        for row, value in zip(self.rows, self.values):
+            row = int(row)
+            if row in repeated:
+                entries[row].append(value)
+            elif entries[row] is None:
+                entries[row] = value
+            else:
+                entries[row] = [entries[row], value]
+                repeated.add(row)
+        return entries
+
+
+class _ColumnBuilder:
+    def __init__(self, wire_type: str):
+        self.wire_type = wire_type
+        self.rows = array("Q")
+        self.values = []
+
+    def append(self, row: int, wire_type: str, value):
+        if wire_type != self.wire_type:
+            self.wire_type = None
+        self.rows.append(row)
+        self.values.append(value)
+
+    def build(self, row_count: int, use_numpy: bool) -> Column:
+        wire_type = self.wire_type
+        values = self.values
+        if wire_type is None:
+            values = [value.value if isinstance(value, FixedBitsValue) else value for value in values]
+        elif wire_type == "varint":
+            try:
+                values = array("Q", values)
+            except OverflowError:
+                # overlong varints don't fit 64 bits
+                pass
+        elif wire_type in FIXED_TYPECODES:
+            bits_typecode, typecode = FIXED_TYPECODES[wire_type]
+            values = array(typecode, array(bits_typecode, [value.unsigned_int for value in values]).tobytes())
+
+        rows = self.rows
+        if use_numpy:
+            rows = numpy.frombuffer(rows, dtype="uint64")
+            if isinstance(values, array):
+                values = numpy.frombuffer(values, dtype=NUMPY_DTYPES[values.typecode])
+        return Column(wire_type=wire_type, rows=rows, values=values, row_count=row_count)
+
+
+def decode_columnar(payloads: Iterable[Union[bytes, bytearray, memoryview]], use_numpy: bool = None,
+                    **parser_options) -> Dict[str, Column]:
+    """
+    Decode `payloads` into a `Column` per dotted field path ("3.1.2"), keyed in order of first appearance.
+    The occurrences of a repeated nested message share their columns, e.g. "3.1" has field 1 of every field 3.
+
+    Numeric columns are `array.array`s, or NumPy arrays when `use_numpy` is true or NumPy is installed and
+    `use_numpy` is None. `parser_options` are passed to `FieldPathParser`.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    elif use_numpy and numpy is None:
+        raise ImportError("use_numpy requires numpy")
+
+    builders: Dict[str, _ColumnBuilder] = {}
+    row = 0
+
+    def sink(path: str, wire_type: str, value):
+        builder = builders.get(path)
+        if builder is None:
+            builder = builders[path] = _ColumnBuilder(wire_type)
+        builder.append(row, wire_type, value)
+
+    parser = FieldPathParser(**parser_options)
+    for payload in payloads:
+        parser.parse_paths(payload, sink)
+        row += 1
+
+    return {path: builder.build(row, use_numpy) for path, builder in builders.items()}
@@ -2,13 +2,51 @@ from __future__ import annotations
 import re
 import struct
 import ctypes
-from typing import List, Tuple, Union
+import time
+import warnings
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+from collections.abc import Mapping, Sequence
 from enum import Enum
+import base64
 import binascii
-from dataclasses import dataclass
+import hashlib
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field as dataclass_field, FrozenInstanceError
 
 HEX_PATTERN = "^[\\0-9a-fA-F\\s]+$"
-ParsedDataType = Union[str, int, "FixedBitsValue", "ParsedResults"]
+HEX_REGEX = re.compile(HEX_PATTERN)
+HEX_SEPARATORS = str.maketrans(":,;-", "    ")
+BASE64_URLSAFE = str.maketrans("-_", "+/")
+DUMP_LINE_PATTERN = re.compile(r"^([0-9a-fA-F]+)(:?)(?:\s+(.*))?$")
+FIELD_PATH_PATTERN = re.compile(r"^(\d+)(?:\[(\d+)\])?$")
+WIRE_TYPE_VALUES = {"varint": 0, "fixed64": 1, "string": 2, "length_delimited": 2, "fixed32": 5}
+UINT64_MASK = (1 << 64) - 1
+# protoc parses nested groups up to this depth and expands length-delimited fields up to DECODE_RAW_BUDGET levels
+DECODE_RAW_GROUP_LIMIT = 100
+DECODE_RAW_BUDGET = 10
+C_ESCAPES = {ord("\n"): "\\n", ord("\r"): "\\r", ord("\t"): "\\t", ord("\""): '\\"', ord("'"): "\\'", ord("\\"): "\\\\"}
+C_ESCAPE_TABLE = [C_ESCAPES.get(byte, chr(byte) if 0x20 <= byte < 0x7F else f"\\{byte:03o}") for byte in range(256)]
+# first byte of a tag with a non-zero field number and a non-group wire type
+TAG_START_PATTERN = re.compile(b"[%s]" % b"".join(
+    re.escape(bytes([byte])) for byte in range(256) if byte & 0x80 or (byte >> 3 and byte & 0x7 in (0, 1, 2, 5))
+))
+ParsedDataType = Union[str, int, "LazyString", "FixedBitsValue", "ParsedResults"]
+
+
+def parse_field_path(path: str) -> List[Tuple[int, int]]:
+    """
+    Split a dotted field path into (field, occurrence) pairs.
+
+    "3.1.2" selects the first field 3, then its first field 1 and so on, "3[1]" selects the second field 3.
+    """
+    field_path = []
+    for part in path.split("."):
+        matched = FIELD_PATH_PATTERN.match(part.strip())
+        if matched is None:
+            raise ValueError(f"Invalid field path: {path!r}")
+        field_path.append((int(matched.group(1)), int(matched.group(2) or 0)))
+    return field_path
 
 
 class FixedBitsValue:
@@ -87,30 +125,116 @@ class FixedBitsValue:
         return dict_result
 
 
+class LazyString:
+    """
+    UTF-8 string field kept as raw bytes and decoded on first access.
+
+    Compares, hashes and prints like the decoded `str`.
+    """
+    __slots__ = ("_data", "_value")
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._value = None
+
+    @property
+    def bytes(self) -> bytes:
+        return self._data
+
+    @property
+    def value(self) -> str:
+        if self._value is None:
+            self._value = str(self._data, "utf-8")
+        return self._value
+
+    @property
+    def is_decoded(self):
+        return self._value is not None
+
+    def __str__(self):
+        return self.value
+
+    def __repr__(self):
+        return repr(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyString):
+            return self._data == other._data
+        if isinstance(other, str):
+            return self.value == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.value)
+
+
 @dataclass(init=False)
 class ParsedResult:
     field: int
     wire_type: str
     data: ParsedDataType
 
-    def __init__(self, field: int, wire_type: str, data: ParsedDataType):
+    # byte offsets in the top-level input, only set by `Parser(track_offsets=True)`
+    offset: int = dataclass_field(default=None, repr=False, compare=False)
+    value_offset: int = dataclass_field(default=None, repr=False, compare=False)
+    value_length: int = dataclass_field(default=None, repr=False, compare=False)
+
+    def __init__(self, field: int, wire_type: str, data: ParsedDataType,
+                 offset: int = None, value_offset: int = None, value_length: int = None):
         self.field = field
         self.wire_type = wire_type
         self.data = data
+        if offset is not None:
+            self.offset = offset
+            self.value_offset = value_offset
+            self.value_length = value_length
 
-    def to_dict(self):
+    @property
+    def has_offsets(self):
+        return self.offset is not None
+
+    @property
+    def end_offset(self):
+        return self.value_offset + self.value_length
+
+    def value_view(self, data) -> memoryview:
+        """
+        Slice the encoded value (without tag and length prefix) out of the parsed input without copying.
+        """
+        if not self.has_offsets:
+            raise ValueError("offsets are not tracked, use Parser(track_offsets=True)")
+        return memoryview(data)[self.value_offset:self.end_offset]
+
+    def to_dict(self, with_offsets: bool = False):
         if isinstance(self.data, ParsedResults):
-            data = self.data.to_dict()
+            data = self.data.to_dict(with_offsets=with_offsets)
         elif isinstance(self.data, FixedBitsValue):
             data = self.data.to_dict()
+        elif isinstance(self.data, LazyString):
+            data = self.data.value
         else:
             data = self.data
 
-        return dict(
+        dict_result = dict(
             field=self.field,
             wire_type=self.wire_type,
             data=data
         )
+        if with_offsets and self.has_offsets:
+            dict_result.update(offset=self.offset, value_offset=self.value_offset, value_length=self.value_length)
+
+        return dict_result
+
+    def __eq__(self, other):
+        if not isinstance(other, ParsedResult):
+            return NotImplemented
+        return (self.field, self.wire_type, self.data) == (other.field, other.wire_type, other.data)
+
+    def view(self) -> ParsedResultView:
+        return ParsedResultView(self)
 
 
 @dataclass
@@ -118,6 +242,12 @@ class ParsedResults:
     results: List[ParsedResult]
     remain_data: str = None
 
+    # field number -> positions in results, built on first lookup
+    _field_index: Tuple[int, dict] = dataclass_field(default=None, init=False, repr=False, compare=False)
+
+    # (start, end) offsets of the corrupted bytes skipped by `Parser(recover=True)`
+    skipped_ranges: List[Tuple[int, int]] = dataclass_field(default=None, repr=False, compare=False)
+
     @property
     def has_results(self):
         return len(self.results) > 0
@@ -129,16 +259,240 @@ class ParsedResults:
     def __getitem__(self, item):
         return self.results[item]
 
-    def to_dict(self):
-        results = [result.to_dict() for result in self.results]
-        dict_results = dict(
-            results=results,
-        )
-        if self.has_remain_data:
-            dict_results["remain_data"] = self.remain_data
+    def _get_field_index(self) -> dict:
+        field_index = self._field_index
+        # rebuild when results were appended after the index was built
+        if field_index is None or field_index[0] != len(self.results):
+            positions = {}
+            for position, result in enumerate(self.results):
+                positions.setdefault(result.field, []).append(position)
+            field_index = (len(self.results), positions)
+            object.__setattr__(self, "_field_index", field_index)
+        return field_index[1]
+
+    def get(self, field: int, default=None) -> Union[ParsedResult, None]:
+        positions = self._get_field_index().get(field)
+        if not positions:
+            return default
+        return self.results[positions[0]]
+
+    def get_all(self, field: int) -> List[ParsedResult]:
+        results = self.results
+        return [results[position] for position in self._get_field_index().get(field, ())]
+
+    def find(self, path: str, default=None) -> Union[ParsedResult, None]:
+        """
+        Look up a nested field by path, e.g. find("3.1.2") or find("3[1].2") for the second field 3.
+        """
+        parsed_results = self
+        result = None
+        for field, occurrence in parse_field_path(path):
+            if not isinstance(parsed_results, ParsedResults):
+                return default
+            positions = parsed_results._get_field_index().get(field, ())
+            if occurrence >= len(positions):
+                return default
+            result = parsed_results.results[positions[occurrence]]
+            parsed_results = result.data
+        return result
+
+    def __eq__(self, other):
+        if not isinstance(other, ParsedResults):
+            return NotImplemented
+        results, other_results = self.results, other.results
+        if results.__class__ is not other_results.__class__:
+            # frozen results are stored as a tuple
+            results, other_results = tuple(results), tuple(other_results)
+        return self.remain_data == other.remain_data and results == other_results
+
+    @property
+    def is_frozen(self):
+        return False
+
+    def freeze(self) -> ParsedResults:
+        """
+        Make the whole tree read-only in place, so it can be shared safely (e.g. by `DecodeCache`).
+        """
+        stack = [self]
+        while stack:
+            parsed_results = stack.pop()
+            if parsed_results.is_frozen:
+                continue
+            for result in parsed_results.results:
+                if isinstance(result.data, ParsedResults):
+                    stack.append(result.data)
+                result.__class__ = FrozenParsedResult
+            object.__setattr__(parsed_results, "results", tuple(parsed_results.results))
+            parsed_results.__class__ = FrozenParsedResults
+        return self
+
+    def to_dict(self, with_offsets: bool = False):
+        """
+        Convert the results into plain dicts and lists.
+
+        Nested messages are expanded with an explicit stack instead of recursion,
+        so arbitrarily deep trees can be converted.
+        `with_offsets` adds the byte offsets of each field when they were tracked.
+        """
+        dict_results = {}
+        stack = [(self, dict_results)]
+        push, pop = stack.append, stack.pop
+        while stack:
+            parsed_results, dict_result = pop()
+            results = []
+            append = results.append
+            dict_result["results"] = results
+            for result in parsed_results.results:
+                data = result.data
+                data_type = data.__class__
+                if data_type is int or data_type is str:
+                    pass
+                elif isinstance(data, ParsedResults):
+                    nested_dict_result = {}
+                    push((data, nested_dict_result))
+                    data = nested_dict_result
+                elif isinstance(data, FixedBitsValue):
+                    data = data.to_dict()
+                elif data_type is LazyString:
+                    data = data.value
+                dict_result_item = {"field": result.field, "wire_type": result.wire_type, "data": data}
+                if with_offsets and result.offset is not None:
+                    dict_result_item["offset"] = result.offset
+                    dict_result_item["value_offset"] = result.value_offset
+                    dict_result_item["value_length"] = result.value_length
+                append(dict_result_item)
+
+            if parsed_results.remain_data is not None:
+                dict_result["remain_data"] = parsed_results.remain_data
+            if parsed_results.skipped_ranges:
+                dict_result["skipped_ranges"] = [list(skipped_range) for skipped_range in parsed_results.skipped_ranges]
 
         return dict_results
 
+    def to_bytes(self) -> bytes:
+        """
+        Encode the results back to the protobuf wire format, remain data is appended as raw bytes.
+        """
+        return bytes(WireEncoder().encode(self))
+
+    def view(self) -> ParsedResultsView:
+        """
+        Return a read-only view with the same shape as `to_dict()`.
+
+        Nothing is converted up front; nested messages are wrapped only when accessed.
+        """
+        return ParsedResultsView(self)
+
+
+class FrozenParsedResult(ParsedResult):
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f"cannot assign to field {name!r}")
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f"cannot delete field {name!r}")
+
+
+class FrozenParsedResults(ParsedResults):
+    results: Tuple[ParsedResult, ...]
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f"cannot assign to field {name!r}")
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f"cannot delete field {name!r}")
+
+    @property
+    def is_frozen(self):
+        return True
+
+
+class ParsedResultView(Mapping):
+    __slots__ = ("_parsed_result",)
+
+    def __init__(self, parsed_result: ParsedResult):
+        self._parsed_result = parsed_result
+
+    def __getitem__(self, key):
+        if key == "field":
+            return self._parsed_result.field
+        if key == "wire_type":
+            return self._parsed_result.wire_type
+        if key == "data":
+            data = self._parsed_result.data
+            if isinstance(data, ParsedResults):
+                return ParsedResultsView(data)
+            if isinstance(data, FixedBitsValue):
+                return data.to_dict()
+            if isinstance(data, LazyString):
+                return data.value
+            return data
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(("field", "wire_type", "data"))
+
+    def __len__(self):
+        return 3
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._parsed_result!r})"
+
+
+class ParsedResultListView(Sequence):
+    __slots__ = ("_results",)
+
+    def __init__(self, results: List[ParsedResult]):
+        self._results = results
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ParsedResultView(result) for result in self._results[index]]
+        return ParsedResultView(self._results[index])
+
+    def __len__(self):
+        return len(self._results)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._results!r})"
+
+
+class ParsedResultsView(Mapping):
+    __slots__ = ("_parsed_results",)
+
+    def __init__(self, parsed_results: ParsedResults):
+        self._parsed_results = parsed_results
+
+    def __getitem__(self, key):
+        if key == "results":
+            return ParsedResultListView(self._parsed_results.results)
+        if key == "remain_data" and self._parsed_results.has_remain_data:
+            return self._parsed_results.remain_data
+        if key == "skipped_ranges" and self._parsed_results.skipped_ranges:
+            return [list(skipped_range) for skipped_range in self._parsed_results.skipped_ranges]
+        raise KeyError(key)
+
+    def _keys(self) -> tuple:
+        keys = ("results",)
+        if self._parsed_results.has_remain_data:
+            keys += ("remain_data",)
+        if self._parsed_results.skipped_ranges:
+            keys += ("skipped_ranges",)
+        return keys
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._parsed_results!r})"
+
 
 class State(Enum):
     FIND_FIELD = 1
@@ -165,6 +519,15 @@ class WireType(Enum):
     EGROUP = 4  # deprecated
 
 
+# next state per wire type, None for wire types that don't exist
+WIRE_TYPE_STATES = (
+    State.PARSE_VARINT, State.PARSE_BIT64, State.PARSE_LENGTH_DELIMITED, State.PARSE_START_GROUP,
+    State.PARSE_END_GROUP, State.PARSE_BIT32, None, None,
+)
+# (field, wire type, next state) of every single-byte tag, None for bytes that continue a longer tag
+TAG_TABLE = tuple((byte >> 3, byte & 0x7, WIRE_TYPE_STATES[byte & 0x7]) if byte < 0x80 else None for byte in range(256))
+
+
 class Utils:
 
     @classmethod
@@ -173,9 +536,8 @@ class Utils:
 
     @classmethod
     def validate(cls, string: str) -> Tuple[bool, str]:
-        regex_validator = re.compile(HEX_PATTERN)
         string = cls.sanitize_input(string)
-        validate_result = regex_validator.match(string)
+        validate_result = HEX_REGEX.match(string)
         if validate_result is None:
             return False, string
 
@@ -187,6 +549,127 @@ class Utils:
 
         return True, hex_string
 
+    @classmethod
+    def hex_to_bytes(cls, string: str) -> bytes:
+        """
+        Decode hex separated by whitespace, ':', '-', ',' or ';', with optional '0x' or '\\x' prefixes.
+        """
+        tokens = string.replace("\\x", " ").translate(HEX_SEPARATORS).split()
+        string = " ".join(token[2:] if token[:2] in ("0x", "0X") else token for token in tokens)
+        try:
+            return bytes.fromhex(string)
+        except ValueError:
+            raise ValueError("Invalid hex format") from None
+
+    @classmethod
+    def base64_to_bytes(cls, string: str) -> bytes:
+        """
+        Decode standard or URL-safe base64, whitespace and missing padding are allowed.
+        """
+        string = "".join(string.split()).translate(BASE64_URLSAFE)
+        if not string.endswith("="):
+            string += "=" * (-len(string) % 4)
+        try:
+            return base64.b64decode(string, validate=True)
+        except binascii.Error:
+            raise ValueError("Invalid base64 format") from None
+
+    @classmethod
+    def dump_to_bytes(cls, string: str) -> bytes:
+        """
+        Decode the output of `xxd` or `hexdump -C`, including `*` lines for repeated rows.
+
+        Rows need the `xxd` offset colon or the `hexdump -C` |...| text column, so plain hex isn't taken for a dump.
+        """
+        hex_parts = []
+        previous_hex_part = None
+        is_repeated = False
+        offset = 0
+        for line in string.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line == "*":
+                is_repeated = True
+                continue
+
+            matched = DUMP_LINE_PATTERN.match(line)
+            if matched is None:
+                raise ValueError(f"Invalid dump line: {line!r}")
+
+            line_offset = int(matched.group(1), 16)
+            if is_repeated and previous_hex_part:
+                row_length = len(previous_hex_part) // 2
+                repeat = (line_offset - offset) // row_length
+                hex_parts.extend([previous_hex_part] * repeat)
+                offset += repeat * row_length
+                is_repeated = False
+
+            columns = matched.group(3) or ""
+            if not matched.group(2) and "|" not in columns:
+                # only the final offset line of hexdump -C has no text column
+                if columns or not hex_parts:
+                    raise ValueError(f"Invalid dump line: {line!r}")
+                continue
+            if matched.group(2):
+                # xxd: hex columns are followed by two spaces and the text column
+                hex_part = columns.split("  ", 1)[0]
+            else:
+                # hexdump -C: the text column is enclosed in |...|
+                hex_part = columns.split("|", 1)[0]
+            hex_part = "".join(hex_part.split())
+            if not hex_part:
+                continue
+
+            hex_parts.append(hex_part)
+            previous_hex_part = hex_part
+            offset = line_offset + len(hex_part) // 2
+
+        try:
+            return bytes.fromhex("".join(hex_parts))
+        except ValueError:
+            raise ValueError("Invalid dump format") from None
+
+    @classmethod
+    def split_delimited(cls, data: bytes) -> Iterator[bytes]:
+        """
+        Split a stream of messages each prefixed with its varint length (`writeDelimitedTo` format).
+        """
+        offset = 0
+        end = len(data)
+        while offset < end:
+            length = 0
+            shift = 0
+            while True:
+                if offset >= end:
+                    raise ValueError("Truncated length prefix")
+                chunk = data[offset]
+                offset += 1
+                length |= (chunk & 0x7F) << shift
+                shift += 7
+                if not chunk & 0x80:
+                    break
+
+            if offset + length > end:
+                raise ValueError(f"Truncated message: {length} bytes expected, {end - offset} left")
+            yield data[offset:offset + length]
+            offset += length
+
+    @classmethod
+    def varint_size(cls, value: int) -> int:
+        return max(1, (value.bit_length() + 6) // 7)
+
+    @classmethod
+    def encode_varint(cls, value: int) -> bytes:
+        if value < 0:
+            value &= UINT64_MASK
+        encoded = bytearray()
+        while value > 0x7F:
+            encoded.append(value & 0x7F | 0x80)
+            value >>= 7
+        encoded.append(value)
+        return bytes(encoded)
+
     @classmethod
     def get_chunked_list(cls, string) -> List[str]:
         while string:
@@ -210,6 +693,11 @@ class Utils:
     def chunk_to_hex_string(cls, chunk) -> str:
         return hex(chunk)[2:].zfill(2)
 
+    @classmethod
+    def bytes_to_hex_string(cls, data: bytes) -> str:
+        hex_string = bytes(data).hex()
+        return " ".join(hex_string[idx:idx + 2] for idx in range(0, len(hex_string), 2))
+
     @classmethod
     def change_endian(cls, string) -> str:
         is_valid, valid_string = cls.validate(string)
@@ -238,15 +726,699 @@ class Utils:
             for result in parsed_results.results:
                 if isinstance(result.data, ParsedResults):
                     print_func("\t" * depth, f"[{result.field}: {result.wire_type}] =>")
-                    cls.show_parsed_results(result.data, depth + 1)
+                    cls.show_parsed_results(result.data, depth + 1, print_func=print_func)
                 else:
                     print_func("\t" * depth, f"[{result.field}: {result.wire_type}] => {result.data}")
         if parsed_results.has_remain_data:
             print_func("\t" * depth, f"left over bytes: {parsed_results.remain_data}")
 
 
+class TreeRenderer:
+    """
+    Writes results in the `Utils.show_parsed_results` format to a text stream, with optional limits.
+
+    `max_string_length` truncates strings and left over bytes, `max_repeated` shows only the first
+    occurrences of each field number per message and `max_depth` doesn't expand deeper nested messages.
+    Elided parts are never formatted, and with `Parser(lazy_strings=True)` truncated strings are only
+    partially decoded. Lines are collected and written in chunks of about `buffer_size` characters.
+    """
+
+    def __init__(self, max_string_length: int = None, max_repeated: int = None, max_depth: int = None,
+                 buffer_size: int = 1 << 16):
+        self._max_string_length = max_string_length
+        self._max_repeated = max_repeated
+        self._max_depth = max_depth
+        self._buffer_size = buffer_size
+
+    def _format_string(self, data) -> str:
+        limit = self._max_string_length
+        if data.__class__ is LazyString:
+            if limit is None or len(data.bytes) <= limit:
+                return data.value
+            # at most 4 bytes per character, a split character at the end is dropped
+            preview = data.bytes[:limit * 4].decode("utf-8", "ignore")[:limit]
+            return f"{preview}... [truncated, {len(data.bytes)} bytes]"
+        if limit is None or len(data) <= limit:
+            return data
+        return f"{data[:limit]}... [truncated, {len(data)} chars]"
+
+    def render(self, parsed_results: ParsedResults, stream):
+        parts = []
+        buffered = 0
+        max_repeated = self._max_repeated
+        max_depth = self._max_depth
+
+        stack = [(parsed_results, iter(parsed_results.results), {}, 0)]
+        while stack:
+            node, results, seen, depth = stack[-1]
+            indent = "\t" * depth
+            for result in results:
+                if max_repeated is not None:
+                    count = seen.get(result.field, 0)
+                    seen[result.field] = count + 1
+                    if count > max_repeated:
+                        continue
+                    if count == max_repeated:
+                        elided = len(node.get_all(result.field)) - max_repeated
+                        line = f"{indent} [{result.field}: ...] {elided} more\n"
+                        parts.append(line)
+                        buffered += len(line)
+                        continue
+
+                data = result.data
+                if isinstance(data, ParsedResults):
+                    if max_depth is not None and depth + 1 > max_depth:
+                        line = f"{indent} [{result.field}: {result.wire_type}] => ... [{len(data.results)} fields]\n"
+                    else:
+                        line = f"{indent} [{result.field}: {result.wire_type}] =>\n"
+                        stack.append((data, iter(data.results), {}, depth + 1))
+                        parts.append(line)
+                        buffered += len(line)
+                        break
+                elif isinstance(data, (str, LazyString)):
+                    line = f"{indent} [{result.field}: {result.wire_type}] => {self._format_string(data)}\n"
+                else:
+                    line = f"{indent} [{result.field}: {result.wire_type}] => {data}\n"
+                parts.append(line)
+                buffered += len(line)
+                if buffered >= self._buffer_size:
+                    stream.write("".join(parts))
+                    parts.clear()
+                    buffered = 0
+            else:
+                stack.pop()
+                if node.remain_data is not None:
+                    line = f"{indent} left over bytes: {self._format_string(node.remain_data)}\n"
+                    parts.append(line)
+                    buffered += len(line)
+
+        if parts:
+            stream.write("".join(parts))
+
+
+class WireEncoder:
+    """
+    Encodes ParsedResults into a single preallocated buffer.
+
+    The size of every nested message is computed bottom-up first, then the fields are written in order
+    without intermediate concatenation. Both passes use an explicit stack, so deep trees are supported.
+    """
+
+    def __init__(self):
+        self._sizes = {}
+        self._payloads = {}
+
+    def encode(self, parsed_results: ParsedResults) -> bytearray:
+        self._sizes = {}
+        self._payloads = {}
+        try:
+            self._compute_sizes(parsed_results)
+            buffer = bytearray(self._sizes[id(parsed_results)])
+            end = self._write(parsed_results, buffer)
+            assert end == len(buffer), "encoded size mismatch"
+            return buffer
+        finally:
+            self._sizes = {}
+            self._payloads = {}
+
+    @staticmethod
+    def _tag(result: ParsedResult) -> int:
+        try:
+            wire_type = WIRE_TYPE_VALUES[result.wire_type]
+        except KeyError:
+            raise ValueError(f"Unsupported wire_type: {result.wire_type}") from None
+        return result.field << 3 | wire_type
+
+    def _payload(self, result: ParsedResult) -> bytes:
+        """
+        Encoded value of a non-nested field, without tag and length prefix.
+        """
+        data = result.data
+        wire_type = result.wire_type
+        if wire_type == "fixed64" or wire_type == "fixed32":
+            size = 8 if wire_type == "fixed64" else 4
+            if isinstance(data, FixedBitsValue):
+                data = data.unsigned_int
+            if isinstance(data, float):
+                return struct.pack("<d" if size == 8 else "<f", data)
+            return (data & ((1 << size * 8) - 1)).to_bytes(size, "little")
+        if isinstance(data, LazyString):
+            return data.bytes
+        if isinstance(data, str):
+            return data.encode("utf-8")
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return bytes(data)
+        raise ValueError(f"Cannot encode {data.__class__.__name__} as {wire_type}")
+
+    def _compute_sizes(self, parsed_results: ParsedResults):
+        sizes = self._sizes
+        payloads = self._payloads
+        varint_size = Utils.varint_size
+        stack = [(parsed_results, False)]
+        while stack:
+            node, is_expanded = stack.pop()
+            if id(node) in sizes:
+                continue
+            if not is_expanded:
+                stack.append((node, True))
+                stack.extend(
+                    (result.data, False) for result in node.results
+                    if isinstance(result.data, ParsedResults) and id(result.data) not in sizes
+                )
+                continue
+
+            size = 0
+            for result in node.results:
+                data = result.data
+                size += varint_size(self._tag(result))
+                if result.wire_type == "varint":
+                    size += varint_size(data & UINT64_MASK if data < 0 else data)
+                elif isinstance(data, ParsedResults):
+                    nested_size = sizes[id(data)]
+                    size += varint_size(nested_size) + nested_size
+                else:
+                    payload = self._payload(result)
+                    payloads[id(result)] = payload
+                    size += len(payload)
+                    if result.wire_type != "fixed64" and result.wire_type != "fixed32":
+                        size += varint_size(len(payload))
+
+            if node.remain_data is not None:
+                remain = bytes.fromhex(node.remain_data)
+                payloads[id(node)] = remain
+                size += len(remain)
+            sizes[id(node)] = size
+
+    def _write(self, parsed_results: ParsedResults, buffer: bytearray) -> int:
+        sizes = self._sizes
+        payloads = self._payloads
+        offset = 0
+
+        def write_varint(value):
+            nonlocal offset
+            if value < 0:
+                value &= UINT64_MASK
+            while value > 0x7F:
+                buffer[offset] = value & 0x7F | 0x80
+                value >>= 7
+                offset += 1
+            buffer[offset] = value
+            offset += 1
+
+        stack = [(parsed_results, iter(parsed_results.results))]
+        while stack:
+            node, results = stack[-1]
+            for result in results:
+                data = result.data
+                write_varint(self._tag(result))
+                if result.wire_type == "varint":
+                    write_varint(data)
+                elif isinstance(data, ParsedResults):
+                    write_varint(sizes[id(data)])
+                    stack.append((data, iter(data.results)))
+                    break
+                else:
+                    payload = payloads[id(result)]
+                    if result.wire_type != "fixed64" and result.wire_type != "fixed32":
+                        write_varint(len(payload))
+                    buffer[offset:offset + len(payload)] = payload
+                    offset += len(payload)
+            else:
+                stack.pop()
+                remain = payloads.get(id(node))
+                if remain is not None:
+                    buffer[offset:offset + len(remain)] = remain
+                    offset += len(remain)
+        return offset
+
+
+def _read_varint(data, offset: int, end: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        if offset >= end:
+            raise ValueError(f"Truncated varint at offset {offset}")
+        chunk = data[offset]
+        offset += 1
+        value |= (chunk & 0x7F) << shift
+        if not chunk & 0x80:
+            return value, offset
+        shift += 7
+
+
+def _skip_field(data, wire_type: int, offset: int, end: int) -> int:
+    """
+    Return the offset after the value of a field whose tag ends at `offset`.
+    """
+    if wire_type == WireType.VARINT.value:
+        offset = _read_varint(data, offset, end)[1]
+    elif wire_type == WireType.LEN.value:
+        length, offset = _read_varint(data, offset, end)
+        offset += length
+    elif wire_type == WireType.I64.value:
+        offset += 8
+    elif wire_type == WireType.I32.value:
+        offset += 4
+    else:
+        raise ValueError(f"Unsupported wire_type {wire_type} at offset {offset}")
+    if offset > end:
+        raise ValueError(f"Truncated field value, ends at {offset} after {end}")
+    return offset
+
+
+def _iter_fields(data, offset: int, end: int) -> Iterator[Tuple[int, int, int, int, int]]:
+    """
+    Skim the fields in data[offset:end], yields (field, wire type, tag offset, value offset, value end).
+
+    Only the field boundaries are read, raises ValueError when the bytes are not a message.
+    """
+    while offset < end:
+        tag_offset = offset
+        tag, offset = _read_varint(data, offset, end)
+        value_offset = offset
+        offset = _skip_field(data, tag & 0x7, offset, end)
+        yield tag >> 3, tag & 0x7, tag_offset, value_offset, offset
+
+
+def _find_field_range(data, field: int, occurrence: int, offset: int, end: int) -> Tuple[int, int, int, int]:
+    """
+    Returns (tag offset, value offset, value end, wire type) of the `occurrence`-th `field` in data[offset:end].
+    """
+    for found_field, wire_type, tag_offset, value_offset, value_end in _iter_fields(data, offset, end):
+        if found_field == field:
+            if occurrence == 0:
+                return tag_offset, value_offset, value_end, wire_type
+            occurrence -= 1
+    raise KeyError(field)
+
+
+# value types patch() can encode per wire type
+PATCH_VALUE_TYPES = {
+    0: int,
+    1: (int, float, FixedBitsValue),
+    2: (str, bytes, bytearray, memoryview, LazyString, ParsedResults),
+    5: (int, float, FixedBitsValue),
+}
+
+
+def patch(data: Union[bytes, bytearray], path: str, value: ParsedDataType) -> Union[bytes, bytearray]:
+    """
+    Replace the field at `path` (see `ParsedResults.find`) with `value`, or remove it when `value` is None.
+
+    Only the fields along the path are skimmed, the new encoding is spliced into the original bytes
+    and the length prefixes of the enclosing messages are rewritten. The field keeps its wire type.
+    A bytearray is patched in place and returned, otherwise new bytes are returned.
+    Raises KeyError when the path does not exist, ValueError when the bytes along it are not a message or
+    `value` can't be encoded with the field's wire type.
+    """
+    field_path = parse_field_path(path)
+
+    # (length prefix offset, payload offset, payload end) of every enclosing message
+    parents = []
+    offset, end = 0, len(data)
+    for depth, (field, occurrence) in enumerate(field_path):
+        try:
+            tag_offset, value_offset, value_end, wire_type = _find_field_range(data, field, occurrence, offset, end)
+        except KeyError:
+            raise KeyError(path) from None
+        if depth == len(field_path) - 1:
+            break
+        if wire_type != WireType.LEN.value:
+            raise KeyError(path)
+        offset = _read_varint(data, value_offset, value_end)[1]
+        parents.append((value_offset, offset, value_end))
+        end = value_end
+
+    if value is None:
+        encoded = b""
+    else:
+        if wire_type not in PATCH_VALUE_TYPES:
+            raise ValueError(f"Cannot patch a field of wire type {wire_type}")
+        if not isinstance(value, PATCH_VALUE_TYPES[wire_type]):
+            raise ValueError(f"Cannot patch a field of wire type {wire_type} with {value.__class__.__name__}")
+        if wire_type == WireType.LEN.value:
+            wire_type_name = "length_delimited" if isinstance(value, ParsedResults) else "string"
+        else:
+            wire_type_name = {0: "varint", 1: "fixed64", 5: "fixed32"}[wire_type]
+        encoded = ParsedResults([ParsedResult(field=field, wire_type=wire_type_name, data=value)]).to_bytes()
+
+    # splices in decreasing offset order, so earlier offsets stay valid when applied in place
+    splices = [(tag_offset, value_end, encoded)]
+    delta = len(encoded) - (value_end - tag_offset)
+    for length_offset, payload_offset, payload_end in reversed(parents):
+        length_prefix = Utils.encode_varint(payload_end - payload_offset + delta)
+        splices.append((length_offset, payload_offset, length_prefix))
+        delta += len(length_prefix) - (payload_offset - length_offset)
+
+    if isinstance(data, bytearray):
+        for start, stop, replacement in splices:
+            data[start:stop] = replacement
+        return data
+
+    data = memoryview(data)
+    parts = []
+    position = 0
+    for start, stop, replacement in reversed(splices):
+        parts.append(data[position:start])
+        parts.append(replacement)
+        position = stop
+    parts.append(data[position:])
+    return b"".join(parts)
+
+
+@dataclass
+class FieldDiff:
+    kind: str  # "added", "removed" or "changed"
+    path: str
+    old: Union[ParsedResult, None] = None
+    new: Union[ParsedResult, None] = None
+
+    def to_dict(self):
+        return dict(
+            kind=self.kind,
+            path=self.path,
+            old=self.old.to_dict() if self.old is not None else None,
+            new=self.new.to_dict() if self.new is not None else None,
+        )
+
+
+def _skim_message(data, offset: int, end: int) -> Union[list, None]:
+    try:
+        return list(_iter_fields(data, offset, end))
+    except ValueError:
+        return None
+
+
+def diff(a: Union[bytes, ParsedResults], b: Union[bytes, ParsedResults], parser: Parser = None) -> List[FieldDiff]:
+    """
+    Compare two messages field by field, returns the differences in field order.
+
+    Fields are paired by field number and occurrence, paths have the `ParsedResults.find` format.
+    The raw bytes of each pair are compared first, so equal fields and submessages are never decoded.
+    Differing length-delimited fields that are nested messages on both sides are compared field by field,
+    other differing fields are decoded with `parser` and reported as a whole.
+    """
+    a = a.to_bytes() if isinstance(a, ParsedResults) else bytes(a)
+    b = b.to_bytes() if isinstance(b, ParsedResults) else bytes(b)
+    if a == b:
+        return []
+
+    a_fields = _skim_message(a, 0, len(a))
+    b_fields = _skim_message(b, 0, len(b))
+    if a_fields is None or b_fields is None:
+        raise ValueError("Both inputs must be valid protobuf messages")
+
+    parser = parser if parser is not None else Parser()
+    diffs = []
+    stack = [_diff_fields(a, b, a_fields, b_fields, "", parser)]
+    while stack:
+        for item in stack[-1]:
+            if isinstance(item, FieldDiff):
+                diffs.append(item)
+            else:
+                stack.append(_diff_fields(a, b, *item, parser))
+                break
+        else:
+            stack.pop()
+    return diffs
+
+
+def _diff_fields(a: bytes, b: bytes, a_fields: list, b_fields: list, prefix: str, parser: Parser):
+    """
+    Yields the FieldDiff of one message level, or the arguments for comparing a nested message in place.
+    """
+    def path_of(field, occurrence):
+        return f"{prefix}{field}[{occurrence}]" if occurrence else f"{prefix}{field}"
+
+    def decode(data, field_range):
+        return parser.parse_bytes(data[field_range[2]:field_range[4]]).results[0]
+
+    b_by_field = {}
+    for field_range in b_fields:
+        b_by_field.setdefault(field_range[0], []).append(field_range)
+
+    a_view, b_view = memoryview(a), memoryview(b)
+    occurrences = {}
+    for a_range in a_fields:
+        field, wire_type, tag_offset, value_offset, value_end = a_range
+        occurrence = occurrences.get(field, 0)
+        occurrences[field] = occurrence + 1
+        b_ranges = b_by_field.get(field, ())
+        if occurrence >= len(b_ranges):
+            yield FieldDiff("removed", path_of(field, occurrence), old=decode(a, a_range))
+            continue
+
+        b_range = b_ranges[occurrence]
+        if a_view[tag_offset:value_end] == b_view[b_range[2]:b_range[4]]:
+            continue
+
+        if wire_type == WireType.LEN.value and b_range[1] == WireType.LEN.value:
+            a_payload_offset = _read_varint(a, value_offset, value_end)[1]
+            b_payload_offset = _read_varint(b, b_range[3], b_range[4])[1]
+            a_payload = a[a_payload_offset:value_end]
+            b_payload = b[b_payload_offset:b_range[4]]
+            if a_payload and b_payload and \
+                    parser._is_maybe_nested_bytes(a_payload) and parser._is_maybe_nested_bytes(b_payload):
+                a_nested = _skim_message(a, a_payload_offset, value_end)
+                b_nested = _skim_message(b, b_payload_offset, b_range[4])
+                if a_nested is not None and b_nested is not None:
+                    yield a_nested, b_nested, f"{path_of(field, occurrence)}."
+                    continue
+
+        yield FieldDiff("changed", path_of(field, occurrence), old=decode(a, a_range), new=decode(b, b_range))
+
+    b_occurrences = {}
+    for b_range in b_fields:
+        field = b_range[0]
+        occurrence = b_occurrences.get(field, 0)
+        b_occurrences[field] = occurrence + 1
+        if occurrence >= occurrences.get(field, 0):
+            yield FieldDiff("added", path_of(field, occurrence), new=decode(b, b_range))
+
+
+def _c_escape(data) -> str:
+    table = C_ESCAPE_TABLE
+    return "".join([table[byte] for byte in data])
+
+
+def _read_field(data, offset: int, end: int) -> Tuple[int, int, int, int]:
+    """
+    Read a tag and the value of a field with protoc's limits, returns (field, wire type, value, offset).
+
+    The value of a length-delimited field is its length. Raises ValueError where protoc fails to parse.
+    """
+    tag = 0
+    for shift in range(0, 35, 7):
+        if offset >= end:
+            raise ValueError(f"Truncated tag at offset {offset}")
+        chunk = data[offset]
+        offset += 1
+        tag |= (chunk & 0x7F) << shift
+        if not chunk & 0x80:
+            break
+    else:
+        raise ValueError(f"Invalid tag at offset {offset}")
+    tag &= 0xFFFFFFFF
+    field, wire_type = tag >> 3, tag & 0x7
+    if field == 0:
+        raise ValueError(f"Invalid field number 0 at offset {offset}")
+
+    value = 0
+    if wire_type == WireType.VARINT.value or wire_type == WireType.LEN.value:
+        for shift in range(0, 70, 7):
+            if offset >= end:
+                raise ValueError(f"Truncated varint at offset {offset}")
+            chunk = data[offset]
+            offset += 1
+            value |= (chunk & 0x7F) << shift
+            if not chunk & 0x80:
+                break
+        else:
+            raise ValueError(f"Invalid varint at offset {offset}")
+        value &= UINT64_MASK
+        if wire_type == WireType.LEN.value and offset + value > end:
+            raise ValueError(f"Truncated length-delimited field at offset {offset}")
+    elif wire_type == WireType.I64.value or wire_type == WireType.I32.value:
+        size = 8 if wire_type == WireType.I64.value else 4
+        if offset + size > end:
+            raise ValueError(f"Truncated fixed{size * 8} field at offset {offset}")
+        value = int.from_bytes(data[offset:offset + size], "little")
+        offset += size
+    elif wire_type != WireType.SGROUP.value and wire_type != WireType.EGROUP.value:
+        raise ValueError(f"Invalid wire_type {wire_type} at offset {offset}")
+    return field, wire_type, value, offset
+
+
+def _skim_field_end(data, offset: int, end: int) -> Union[int, None]:
+    """
+    End offset of the field starting at `offset` if protoc would accept it and it fits, otherwise None.
+
+    Group wire types are rejected. Nothing is allocated, so it is cheap to call at every offset of a blob.
+    """
+    tag = 0
+    shift = 0
+    while True:
+        if offset >= end or shift > 28:
+            return None
+        chunk = data[offset]
+        offset += 1
+        tag |= (chunk & 0x7F) << shift
+        if not chunk & 0x80:
+            break
+        shift += 7
+    tag &= 0xFFFFFFFF
+    if tag >> 3 == 0:
+        return None
+
+    wire_type = tag & 0x7
+    if wire_type == WireType.VARINT.value or wire_type == WireType.LEN.value:
+        value = 0
+        shift = 0
+        while True:
+            if offset >= end or shift > 63:
+                return None
+            chunk = data[offset]
+            offset += 1
+            value |= (chunk & 0x7F) << shift
+            if not chunk & 0x80:
+                break
+            shift += 7
+        if wire_type == WireType.LEN.value:
+            offset += value & UINT64_MASK
+    elif wire_type == WireType.I64.value:
+        offset += 8
+    elif wire_type == WireType.I32.value:
+        offset += 4
+    else:
+        return None
+    return offset if offset <= end else None
+
+
+def _is_decode_raw_message(data, offset: int, end: int, group_limit: int) -> bool:
+    groups = []
+    try:
+        while offset < end:
+            field, wire_type, value, offset = _read_field(data, offset, end)
+            if wire_type == WireType.LEN.value:
+                offset += value
+            elif wire_type == WireType.SGROUP.value:
+                if len(groups) >= group_limit:
+                    return False
+                groups.append(field)
+            elif wire_type == WireType.EGROUP.value:
+                if not groups or groups.pop() != field:
+                    return False
+    except ValueError:
+        return False
+    return not groups
+
+
+def write_decode_raw(data, stream, buffer_size: int = 1 << 16):
+    """
+    Write `protoc --decode_raw` text for the message in `data` to the text stream `stream`.
+
+    Fields are written while the input is read, no ParsedResults tree is built, so `data` may be an mmap
+    of a message larger than memory. Like protoc, a length-delimited field is shown as a nested message
+    only when its whole payload parses as one, otherwise as a C-escaped string.
+    Raises ValueError without writing anything when protoc would fail to parse the input.
+    """
+    end = len(data)
+    if not _is_decode_raw_message(data, 0, end, DECODE_RAW_GROUP_LIMIT):
+        raise ValueError("Failed to parse input.")
+
+    parts = []
+    buffered = 0
+    offset = 0
+    # (end of the message, recursion budget, whether it is a group), groups end at their end-group tag
+    stack = [(end, DECODE_RAW_BUDGET, False)]
+    while stack:
+        message_end, budget, is_group = stack[-1]
+        indent = "  " * (len(stack) - 1)
+        if not is_group and offset >= message_end:
+            stack.pop()
+            if not stack:
+                break
+            line = f"{indent[2:]}}}\n"
+        else:
+            field, wire_type, value, offset = _read_field(data, offset, message_end)
+            if wire_type == WireType.VARINT.value:
+                line = f"{indent}{field}: {value}\n"
+            elif wire_type == WireType.I64.value:
+                line = f"{indent}{field}: 0x{value:016x}\n"
+            elif wire_type == WireType.I32.value:
+                line = f"{indent}{field}: 0x{value:08x}\n"
+            elif wire_type == WireType.LEN.value:
+                payload_end = offset + value
+                if value and budget > 0 and _is_decode_raw_message(data, offset, payload_end, budget):
+                    line = f"{indent}{field} {{\n"
+                    stack.append((payload_end, budget - 1, False))
+                else:
+                    line = f'{indent}{field}: "{_c_escape(data[offset:payload_end])}"\n'
+                    offset = payload_end
+            elif wire_type == WireType.SGROUP.value:
+                line = f"{indent}{field} {{\n"
+                stack.append((message_end, budget - 1, True))
+            else:
+                stack.pop()
+                line = f"{indent[2:]}}}\n"
+
+        parts.append(line)
+        buffered += len(line)
+        if buffered >= buffer_size:
+            stream.write("".join(parts))
+            parts.clear()
+            buffered = 0
+
+    if parts:
+        stream.write("".join(parts))
+
+
+def find_messages(data: Union[bytes, bytearray, memoryview], min_fields: int = 2, min_len: int = 8,
+                  parser: Parser = None) -> Iterator[Tuple[int, int, ParsedResults]]:
+    """
+    Carve protobuf messages out of an arbitrary binary blob, yields (offset, length, ParsedResults).
+
+    Every offset is a candidate start. From there valid fields are skimmed as far as they go, and the
+    candidate is decoded with `parser` when it has at least `min_fields` fields and `min_len` bytes.
+    Scanning resumes after a found message. The field boundaries of a rejected candidate are remembered,
+    since a candidate starting at one of them has the same fields minus the first ones and is rejected too.
+    """
+    parser = parser if parser is not None else Parser()
+    end = len(data)
+    rejected = set()
+    offset = 0
+    while offset < end:
+        matched = TAG_START_PATTERN.search(data, offset)
+        if matched is None:
+            break
+        offset = matched.start()
+        if offset in rejected:
+            rejected.discard(offset)
+            offset += 1
+            continue
+
+        boundaries = []
+        field_end = _skim_field_end(data, offset, end)
+        while field_end is not None:
+            boundaries.append(field_end)
+            field_end = _skim_field_end(data, field_end, end)
+
+        message_end = boundaries[-1] if boundaries else offset
+        if len(boundaries) >= min_fields and message_end - offset >= min_len:
+            yield offset, message_end - offset, parser.parse_bytes(data[offset:message_end])
+            rejected = {boundary for boundary in rejected if boundary >= message_end}
+            offset = message_end
+        else:
+            rejected.update(boundaries)
+            offset += 1
+
+
 class BytesBuffer:
+    """
+    Deprecated, the parser no longer buffers bytes. Kept for code that imports it.
+    """
     def __init__(self):
+        warnings.warn("BytesBuffer is deprecated and unused by Parser", DeprecationWarning, stacklevel=2)
         self._buffer = []
 
     def append(self, byte_string):
@@ -260,7 +1432,11 @@ class BytesBuffer:
 
 
 class Fetcher:
+    """
+    Deprecated, the parser reads fixed-size values in one slice. Kept for code that imports it.
+    """
     def __init__(self):
+        warnings.warn("Fetcher is deprecated and unused by Parser", DeprecationWarning, stacklevel=2)
         self._data_length = 0
         self._fetch_index = 0
 
@@ -302,7 +1478,12 @@ class Fetcher:
 
 
 class RemainChunkTransaction:
+    """
+    Deprecated, collects left over bytes chunk by chunk as hex strings. Parser uses `RemainOffsetTransaction`.
+    """
     def __init__(self):
+        warnings.warn("RemainChunkTransaction is deprecated, Parser uses RemainOffsetTransaction",
+                      DeprecationWarning, stacklevel=2)
         self._is_done = True
         self._remain_hex_string_list = []
 
@@ -338,28 +1519,284 @@ class RemainChunkTransaction:
         return len(self._remain_hex_string_list) > 0
 
 
+class RemainOffsetTransaction:
+    """
+    Tracks where the bytes that are not part of a completed field start.
+
+    Left over bytes are sliced from the input once parsing ends instead of being collected byte by byte.
+    """
+
+    def __init__(self, offset: int = 0):
+        self._is_done = True
+        self._offset = offset
+
+    def start(self):
+        self._is_done = False
+
+    def done(self, offset: int):
+        self._is_done = True
+        self._offset = offset
+
+    @property
+    def is_done(self):
+        return self._is_done
+
+    @property
+    def offset(self):
+        return self._offset
+
+    def has_remain_data(self, end: int) -> bool:
+        return self._offset < end
+
+    def remain_hex_string(self, data, end: int) -> str:
+        return Utils.bytes_to_hex_string(data[self._offset:end])
+
+
+class DecodeCache:
+    """
+    LRU cache of parsed results keyed by a hash of the input bytes.
+
+    `max_entries` and `max_bytes` (total size of the cached inputs) bound the cache, either can be None.
+    Cached results are frozen and shared between callers.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = None):
+        if max_entries is None and max_bytes is None:
+            raise ValueError("max_entries or max_bytes is required")
+
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(data: bytes, *options) -> tuple:
+        return options + (hashlib.blake2b(data, digest_size=16).digest(),)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, parsed_results: ParsedResults, size: int) -> ParsedResults:
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+
+        parsed_results.freeze()
+        if self._max_bytes is not None and size > self._max_bytes:
+            return parsed_results
+
+        self._entries[key] = (parsed_results, size)
+        self._bytes += size
+        self._evict()
+        return parsed_results
+
+    def _evict(self):
+        while (
+                (self._max_entries is not None and len(self._entries) > self._max_entries)
+                or (self._max_bytes is not None and self._bytes > self._max_bytes)
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def to_dict(self):
+        return dict(
+            entries=len(self._entries),
+            bytes=self._bytes,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+_default_cache: Union[DecodeCache, None] = None
+
+
+def set_decode_cache(cache: Union[DecodeCache, None]):
+    """
+    Set the cache used by every `Parser` created without its own `cache`, None disables it.
+    """
+    global _default_cache
+    _default_cache = cache
+
+
+def get_decode_cache() -> Union[DecodeCache, None]:
+    return _default_cache
+
+
+class ParserStats:
+    """
+    Counters collected by a `Parser` created with `stats=ParserStats()`.
+
+    One instance can be shared by several parsers and accumulates until `reset()`.
+    """
+    STATE_BYTES_LABELS = {
+        State.FIND_FIELD: "tag",
+        State.PARSE_VARINT: "varint",
+        State.PARSE_LENGTH_DELIMITED: "length_delimited",
+        State.GET_DELIMITED_DATA: "length_delimited",
+        State.PARSE_BIT64: "fixed64",
+        State.PARSE_BIT32: "fixed32",
+        State.PARSE_START_GROUP: "group",
+        State.PARSE_END_GROUP: "group",
+        State.TERMINATED: "terminated",
+    }
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.state_calls = {state.name: 0 for state in State}
+        self.bytes_per_wire_type = {label: 0 for label in self.STATE_BYTES_LABELS.values()}
+        self.nested_attempts = 0
+        self.nested_fallbacks = 0
+        self.nested_memo_hits = 0
+        self.nested_checks = 0
+        self.nested_check_seconds = 0.0
+        self.peak_depth = 0
+
+    def to_dict(self):
+        return dict(
+            state_calls=dict(self.state_calls),
+            bytes_per_wire_type=dict(self.bytes_per_wire_type),
+            nested_attempts=self.nested_attempts,
+            nested_fallbacks=self.nested_fallbacks,
+            nested_memo_hits=self.nested_memo_hits,
+            nested_checks=self.nested_checks,
+            nested_check_seconds=self.nested_check_seconds,
+            peak_depth=self.peak_depth,
+        )
+
+
+@dataclass
+class ParserFrame:
+    field: int
+    end: int
+    parsed_data: List[ParsedResult]
+    transaction: RemainOffsetTransaction
+    subtree_key: tuple = None
+    field_offset: int = None
+    value_offset: int = None
+
+
 class Parser:
-    def __init__(self, nexted_depth: int = 0, strict: bool = False):
-        self._nested_depth = nexted_depth
-        self._buffer = BytesBuffer()
-        self._fetcher = Fetcher()
+    def __init__(self, nexted_depth: int = 0, strict: bool = False, cache: DecodeCache = None,
+                 memoize_subtrees: bool = False, subtree_cache: DecodeCache = None, stats: ParserStats = None,
+                 track_offsets: bool = False, lazy_strings: bool = False, recover: bool = False):
+        # nexted_depth is unused since nested messages are parsed on a frame stack, it stays for compatibility
         self._target_field = None
         self._parsed_data: List[ParsedResult] = []
         self._state = State.FIND_FIELD
         self._is_strict = strict
+        self._cache = cache
+
+        # identical nested payloads share one ParsedResults, within a parse call and optionally across calls
+        self._memoize_subtrees = memoize_subtrees or subtree_cache is not None
+        self._subtree_cache = subtree_cache
+        self._subtrees = {}
+
+        # shared subtrees can't carry offsets of each of their occurrences
+        if track_offsets and self._memoize_subtrees:
+            raise ValueError("track_offsets can't be used with memoize_subtrees or subtree_cache")
+        self._track_offsets = track_offsets
+        self._lazy_strings = lazy_strings
+
+        # strict mode rejects the corrupted input recovery would skip
+        if recover and strict:
+            raise ValueError("recover can't be used with strict")
+        self._recover = recover
+        self._skipped_ranges = []
+        self._field_offset = None
+        self._value_offset = None
+        # added to tracked offsets when `data` is a part of a larger input, see StreamParser
+        self._base_offset = 0
+
+        self._t = RemainOffsetTransaction()
+
+        self._data = b""
+        self._offset = 0
+        self._end = 0
+        self._frames: List[ParserFrame] = []
+
+        self._handlers = {
+            State.FIND_FIELD: self._handler_find_field,
+            State.PARSE_VARINT: self._parse_varint_handler,
+            State.PARSE_LENGTH_DELIMITED: self._parse_length_delimited_handler,
+            State.GET_DELIMITED_DATA: self._skip_handler,
+            State.PARSE_BIT64: self._parse_bit64_handler,
+            State.PARSE_BIT32: self._parse_bit32_handler,
+            State.PARSE_START_GROUP: self._skip_handler,
+            State.PARSE_END_GROUP: self._skip_handler,
+            State.TERMINATED: self._skip_handler,
+        }
+        if recover:
+            for state in (State.GET_DELIMITED_DATA, State.PARSE_START_GROUP, State.PARSE_END_GROUP, State.TERMINATED):
+                self._handlers[state] = self._recover_handler
+
+        # subclasses customizing the documented hex string check still decide what is nested
+        if type(self).is_maybe_nested_protobuf is not Parser.is_maybe_nested_protobuf:
+            self._is_maybe_nested_bytes = lambda data: self.is_maybe_nested_protobuf(data.hex())
+
+        # instrumentation replaces the handlers instead of checking a flag for every byte
+        self._stats = stats
+        if stats is not None:
+            self._instrument(stats)
 
-        self._t = RemainChunkTransaction()
+    @property
+    def stats(self) -> Union[ParserStats, None]:
+        return self._stats
 
-    def _create_nested_parser(self) -> Parser:
-        return Parser(nexted_depth=self._nested_depth + 1, strict=self._is_strict)
+    def _instrument(self, stats: ParserStats):
+        for state, handler in self._handlers.items():
+            self._handlers[state] = self._instrument_handler(stats, state, handler)
 
-    @staticmethod
-    def _has_next(chunk_bytes) -> bool:
-        return bool(chunk_bytes & 0x80)
+        is_maybe_nested_bytes = self._is_maybe_nested_bytes
 
-    @staticmethod
-    def _get_value(chunk_bytes) -> int:
-        return chunk_bytes & 0x7F
+        def _timed_is_maybe_nested_bytes(data):
+            started = time.perf_counter()
+            try:
+                return is_maybe_nested_bytes(data)
+            finally:
+                stats.nested_checks += 1
+                stats.nested_check_seconds += time.perf_counter() - started
+
+        self._is_maybe_nested_bytes = _timed_is_maybe_nested_bytes
+
+    def _instrument_handler(self, stats: ParserStats, state: State, handler):
+        state_calls = stats.state_calls
+        bytes_per_wire_type = stats.bytes_per_wire_type
+        name = state.name
+        label = ParserStats.STATE_BYTES_LABELS[state]
+
+        def _handler(chunk):
+            offset = self._offset
+            handler(chunk)
+            state_calls[name] += 1
+            # handlers may skip over a whole payload at once
+            bytes_per_wire_type[label] += self._offset - offset + 1
+
+        return _handler
 
     @staticmethod
     def _parse_wire_type(chunk_bytes) -> Tuple[int, int]:
@@ -367,118 +1804,167 @@ class Parser:
         field = chunk_bytes >> 3
         return wire_type, field
 
-    def _get_buffered_value(self, mask=7) -> int:
-        bit_value = 0
-        for idx, byte_string in enumerate(self._buffer):
-            bit_value += byte_string << (mask * idx)
-        return bit_value
+    def _read_long_varint(self, chunk) -> Union[int, None]:
+        """
+        Read the rest of a varint whose first byte `chunk` has the continuation bit set.
 
-    def _next_buffer_handler(self, value):
-        self._buffer.append(value)
+        Returns None and consumes the rest of the message when the varint isn't terminated.
+        """
+        data = self._data
+        offset = self._offset
+        end = self._end
+        if offset < end:
+            next_chunk = data[offset]
+            if next_chunk < 0x80:
+                self._offset = offset + 1
+                return (chunk & 0x7F) | next_chunk << 7
+
+        value = chunk & 0x7F
+        shift = 7
+        while offset < end:
+            chunk = data[offset]
+            offset += 1
+            value |= (chunk & 0x7F) << shift
+            if chunk < 0x80:
+                self._offset = offset
+                return value
+            shift += 7
+
+        self._offset = end
+        return None
 
     def _handler_find_field(self, chunk):
-        value = self._get_value(chunk)
-        if self._has_next(chunk):
-            return self._next_buffer_handler(value)
+        tag = TAG_TABLE[chunk]
+        if tag is not None:
+            field, wire_type, state = tag
+        else:
+            value = self._read_long_varint(chunk)
+            if value is None:
+                return
+            wire_type, field = self._parse_wire_type(value)
+            state = WIRE_TYPE_STATES[wire_type]
 
         self._t.start()
-
-        self._buffer.append(value)
-        bit_value = self._get_buffered_value()
-        wire_type, field = self._parse_wire_type(bit_value)
         self._target_field = field
+        self._field_offset = self._t.offset
+        self._value_offset = self._offset
 
-        if wire_type == WireType.VARINT.value:
-            self._state = State.PARSE_VARINT
-        elif wire_type == WireType.LEN.value:
-            self._state = State.PARSE_LENGTH_DELIMITED
-        elif wire_type == WireType.I64.value:
-            self._state = State.PARSE_BIT64
-        elif wire_type == WireType.I32.value:
-            self._state = State.PARSE_BIT32
-        elif wire_type == WireType.SGROUP.value:
-            self._state = State.PARSE_START_GROUP
-        elif wire_type == WireType.EGROUP.value:
-            self._state = State.PARSE_END_GROUP
-        elif wire_type == WireType.EGROUP.value:
-            self._state = State.TERMINATED
-        else:
+        if state is None:
             if self._is_strict:
                 raise AssertionError(f"Invalid wire_type: {wire_type}")
-            self._state = State.TERMINATED
-
-        self._buffer.flush()
+            state = State.TERMINATED
+        self._state = state
 
     def _parse_varint_handler(self, chunk):
-        value = self._get_value(chunk)
-        if self._has_next(chunk):
-            return self._next_buffer_handler(value)
+        value = chunk if chunk < 0x80 else self._read_long_varint(chunk)
+        if value is None:
+            return
 
-        self._buffer.append(value)
-        bit_value = self._get_buffered_value()
-        self._parsed_data.append(
-            ParsedResult(
-                field=self._target_field,
-                wire_type="varint",
-                data=bit_value
-            )
-        )
+        self._append_result("varint", value, self._offset)
+        self._state = State.FIND_FIELD
+        self._t.done(self._offset)
+
+    def _parse_fixed_handler(self, chunk, size: int):
+        start = self._offset - 1
+        end = start + size
+        if end > self._end:
+            # truncated value, the rest of the message is left over
+            self._offset = self._end
+            return
+
+        bits = size * 8
+        self._offset = end
+        self._append_result(f"fixed{bits}", FixedBitsValue(bit_value=int.from_bytes(self._data[start:end], "little"),
+                                                           bits=bits), end)
+        self._state = State.FIND_FIELD
+        self._t.done(end)
+
+    def _parse_bit64_handler(self, chunk):
+        self._parse_fixed_handler(chunk, 8)
+
+    def _parse_bit32_handler(self, chunk):
+        self._parse_fixed_handler(chunk, 4)
+
+    def _skip_handler(self, chunk):
+        # states without a way back, the rest of the message is left over as a whole
+        self._offset = self._end
 
+    def _recover_handler(self, chunk):
+        """
+        Skip a corrupted top-level field up to the next plausible field and continue decoding there.
+        """
+        if self._frames:
+            return
+
+        start = self._field_offset
+        offset = self._find_plausible_field(start + 1)
+        if offset is None:
+            # nothing plausible follows, everything from the corrupted field on is left over
+            self._t = RemainOffsetTransaction(start)
+            self._offset = self._end
+            return
+
+        self._skipped_ranges.append((start, offset))
+        self._offset = offset
         self._state = State.FIND_FIELD
-        self._buffer.flush()
-        self._t.done()
-
-    def _parse_fixed_handler(self, chunk):
-        self._next_buffer_handler(chunk)
-        self._fetcher.fetch()
-
-        if not self._fetcher.has_next:
-            bits = self._fetcher.fetching_bits
-            int_value = self._get_buffered_value(mask=8)
-
-            self._parsed_data.append(
-                ParsedResult(
-                    field=self._target_field,
-                    wire_type=f"fixed{bits}",
-                    data=FixedBitsValue(bit_value=int_value, bits=bits)
-                )
-            )
+        self._t.done(offset)
 
-            self._state = State.FIND_FIELD
-            self._buffer.flush()
-            self._fetcher.seek()
-            self._t.done()
+    def _find_plausible_field(self, offset: int) -> Union[int, None]:
+        """
+        First offset from `offset` on where a valid field ends either the message or before another valid field.
+
+        Each candidate costs a few bounded varint reads, so resynchronizing is linear in the skipped bytes.
+        """
+        data, end = self._data, self._end
+        for candidate in range(offset, end):
+            field_end = _skim_field_end(data, candidate, end)
+            if field_end is not None and (field_end == end or _skim_field_end(data, field_end, end) is not None):
+                return candidate
+        return None
 
     def _zero_length_delimited_handler(self):
-        self._parsed_data.append(
-            ParsedResult(
-                field=self._target_field,
-                wire_type="string",
-                data=""
-            )
-        )
+        self._append_result("string", LazyString(b"") if self._lazy_strings else "", self._offset)
         self._state = State.FIND_FIELD
-        self._buffer.flush()
-        self._t.done()
+        self._t.done(self._offset)
 
     def _parse_length_delimited_handler(self, chunk):
-        value = self._get_value(chunk)
-        if self._has_next(chunk):
-            return self._next_buffer_handler(value)
+        data_length = chunk if chunk < 0x80 else self._read_long_varint(chunk)
+        if data_length is None:
+            return
 
-        self._buffer.append(value)
-        data_length = self._get_buffered_value()
+        self._value_offset = self._offset
         if data_length == 0:
             return self._zero_length_delimited_handler()
 
-        self._fetcher.set_data_length(data_length)
-        self._state = State.GET_DELIMITED_DATA
-        self._buffer.flush()
-        self._t.done()
-
-    def _next_get_delimited_data_handler(self, value):
-        self._fetcher.fetch()
-        self._buffer.append(value)
+        self._t.done(self._offset)
+
+        data_end = self._offset + data_length
+        if data_end > self._end:
+            # The payload runs past the end of the message, remaining bytes are left over
+            self._state = State.GET_DELIMITED_DATA
+            return
+
+        data = self._data[self._offset:data_end]
+        if data.__class__ is memoryview:
+            # results must not keep the caller's buffer exported
+            data = data.tobytes()
+        if self._is_maybe_nested_bytes(data):
+            if not self._memoize_subtrees:
+                return self._push_frame(data_end)
+
+            # frames keep only the digest, a copy of every enclosing payload would cost O(size * depth)
+            subtree_key = self._cache_key(data)
+            parsed_results = self._get_memoized_subtree(subtree_key)
+            if parsed_results is not None:
+                if self._stats is not None:
+                    self._stats.nested_memo_hits += 1
+                return self._nested_results_handler(parsed_results, data_end)
+            return self._push_frame(data_end, subtree_key)
+
+        self._append_result("string", LazyString(data) if self._lazy_strings else data.decode("utf-8"), data_end)
+        self._offset = data_end
+        self._state = State.FIND_FIELD
+        self._t.done(data_end)
 
     @staticmethod
     def is_maybe_nested_protobuf(string_or_not) -> bool:
@@ -491,10 +1977,23 @@ class Parser:
         Returns:
             bool: True if the input is likely a nested protobuf, otherwise False.
         """
+        return Parser._is_maybe_nested_bytes(bytes.fromhex(string_or_not))
+
+    @staticmethod
+    def _is_maybe_nested_bytes(data: bytes) -> bool:
+        # Bytes below 0x20 are always single characters in UTF-8, so a control byte
+        # within the first 4 bytes is within the first 4 characters, or the data isn't UTF-8 at all
+        for c in data[0:4]:
+            if c < 0x20:
+                return True
 
-        # Try to convert the input hex string to UTF-8
+        # ASCII is valid UTF-8 and needs no decoding
+        if data.isascii():
+            return False
+
+        # Try to decode the payload as UTF-8
         try:
-            _data = Utils.hex_string_to_utf8(string_or_not)
+            _data = data.decode("utf-8")
         except UnicodeDecodeError:
             # If a UnicodeDecodeError occurs, it's possibly a nested protobuf
             return True
@@ -509,86 +2008,559 @@ class Parser:
         # If none of the above conditions were met, it's likely not a nested protobuf
         return False
 
-    def _get_delimited_data_handler(self, chunk):
-        value = chunk
-        if self._fetcher.has_next:
-            return self._next_get_delimited_data_handler(value)
+    def _get_memoized_subtree(self, subtree_key: tuple) -> Union[ParsedResults, None]:
+        parsed_results = self._subtrees.get(subtree_key)
+        if parsed_results is None and self._subtree_cache is not None:
+            parsed_results = self._subtree_cache.get(subtree_key)
+        return parsed_results
 
-        self._buffer.append(value)
-        data = list(map(lambda x: hex(x)[2:].zfill(2), self._buffer))
+    def _memoize_subtree(self, subtree_key: tuple, parsed_results: ParsedResults, size: int) -> ParsedResults:
+        if self._subtree_cache is not None:
+            parsed_results = self._subtree_cache.put(subtree_key, parsed_results, size)
+        self._subtrees[subtree_key] = parsed_results
+        return parsed_results
 
-        string_or_not = "".join(data)
-        if self.is_maybe_nested_protobuf(string_or_not):
-            data = self._create_nested_parser().parse(string_or_not)
-            wire_type = "length_delimited"
-        else:
-            data = Utils.hex_string_to_utf8(string_or_not)
-            wire_type = "string"
+    def _append_result(self, wire_type: str, data: ParsedDataType, end: int):
+        if not self._track_offsets:
+            self._parsed_data.append(ParsedResult(field=self._target_field, wire_type=wire_type, data=data))
+            return
 
         self._parsed_data.append(
             ParsedResult(
                 field=self._target_field,
                 wire_type=wire_type,
-                data=data
+                data=data,
+                offset=self._base_offset + self._field_offset,
+                value_offset=self._base_offset + self._value_offset,
+                value_length=end - self._value_offset
+            )
+        )
+
+    def _nested_results_handler(self, parsed_results: ParsedResults, end):
+        self._append_result("length_delimited", parsed_results, end)
+        self._offset = end
+        self._state = State.FIND_FIELD
+        self._t.done(end)
+
+    def _push_frame(self, end, subtree_key: tuple = None):
+        """
+        Start parsing a nested message which ends at `end` without leaving the main loop.
+        """
+        self._frames.append(
+            ParserFrame(
+                field=self._target_field,
+                end=self._end,
+                parsed_data=self._parsed_data,
+                transaction=self._t,
+                subtree_key=subtree_key,
+                field_offset=self._field_offset,
+                value_offset=self._value_offset
             )
         )
-        self._buffer.flush()
-        self._fetcher.seek()
+        self._parsed_data = []
+        self._t = RemainOffsetTransaction(self._offset)
+        self._end = end
         self._state = State.FIND_FIELD
-        self._t.done()
+
+        if self._stats is not None:
+            self._stats.nested_attempts += 1
+            self._stats.peak_depth = max(self._stats.peak_depth, len(self._frames))
+
+    def _pop_frame(self):
+        self._assert_done()
+        parsed_results = self._create_parsed_results()
+        if self._stats is not None and parsed_results.has_remain_data:
+            self._stats.nested_fallbacks += 1
+
+        frame = self._frames.pop()
+        if self._memoize_subtrees:
+            parsed_results = self._memoize_subtree(frame.subtree_key, parsed_results, self._end - frame.value_offset)
+
+        self._parsed_data = frame.parsed_data
+        self._t = frame.transaction
+        self._end = frame.end
+        self._target_field = frame.field
+        self._field_offset = frame.field_offset
+        self._value_offset = frame.value_offset
+
+        self._nested_results_handler(parsed_results, self._offset)
+
+    def _assert_done(self):
+        if self._is_strict:
+            assert self._t.is_done, "parsing process is not done, Maybe invalid protobuf"
 
     def _create_parsed_results(self) -> ParsedResults:
-        if not self._t.has_remain_data:
+        if not self._t.has_remain_data(self._end):
             return ParsedResults(results=self._parsed_data)
 
         return ParsedResults(
             results=self._parsed_data,
-            remain_data=self._t.remain_hex_string
+            remain_data=self._t.remain_hex_string(self._data, self._end)
         )
 
     def parse(self, test_target) -> ParsedResults:
         if test_target == "":
-            return self._create_parsed_results()
+            return self._parse(b"")
 
         is_valid, validate_string = Utils.validate(test_target)
         if not is_valid:
             raise ValueError("Invalid hex format")
 
-        for hex_chunk in Utils.get_chunked_list(validate_string):
-            chunk = Utils.hex_string_to_decimal(hex_chunk)
+        return self._parse(bytes.fromhex(validate_string))
 
-            self._t.consume_chunk(chunk)
+    def parse_bytes(self, data: Union[bytes, bytearray, memoryview]) -> ParsedResults:
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        return self._parse(data)
 
-            if self._state == State.FIND_FIELD:
-                self._handler_find_field(chunk)
+    def parse_hex(self, string: str) -> ParsedResults:
+        return self._parse(Utils.hex_to_bytes(string))
 
-            elif self._state == State.PARSE_VARINT:
-                self._parse_varint_handler(chunk)
+    def parse_base64(self, string: str) -> ParsedResults:
+        return self._parse(Utils.base64_to_bytes(string))
 
-            elif self._state == State.PARSE_LENGTH_DELIMITED:
-                self._parse_length_delimited_handler(chunk)
+    def parse_dump(self, string: str) -> ParsedResults:
+        return self._parse(Utils.dump_to_bytes(string))
+
+    def iter_stream(self, fp, chunk_size: int = None) -> Iterator[ParsedResult]:
+        """
+        Decode a single message read from a binary file object, yielding top-level fields as they complete.
+        """
+        return StreamParser(parser=self, chunk_size=chunk_size).iter_fields(fp)
+
+    def _reset(self):
+        self._target_field = None
+        self._parsed_data = []
+        self._state = State.FIND_FIELD
+        self._t = RemainOffsetTransaction()
+        self._frames = []
+        self._subtrees = {}
+        self._skipped_ranges = []
+
+    def _cache_key(self, data: bytes) -> tuple:
+        # subclasses may decide differently what is nested
+        return DecodeCache.make_key(data, type(self), self._is_strict, self._track_offsets, self._base_offset,
+                                    self._lazy_strings, self._recover)
+
+    def _parse(self, data: bytes) -> ParsedResults:
+        cache = self._cache if self._cache is not None else _default_cache
+        if cache is None:
+            return self._parse_data(data)
+
+        key = self._cache_key(data)
+        parsed_results = cache.get(key)
+        if parsed_results is None:
+            parsed_results = cache.put(key, self._parse_data(data), len(data))
+        return parsed_results
+
+    def _parse_data(self, data: bytes) -> ParsedResults:
+        self._run(data)
+
+        parsed_results = self._create_parsed_results()
+        if self._skipped_ranges:
+            parsed_results.skipped_ranges = self._skipped_ranges
+        return parsed_results
+
+    def _run(self, data: bytes):
+        self._reset()
+        self._data = data
+        self._offset = 0
+        self._end = len(data)
+
+        handlers = self._handlers
+        while True:
+            while self._offset < self._end:
+                chunk = data[self._offset]
+                self._offset += 1
+
+                handlers[self._state](chunk)
+
+            if not self._frames:
+                break
+
+            self._pop_frame()
+
+        self._assert_done()
+
+
+class FieldPathParser(Parser):
+    """
+    Reports every decoded value with its dotted field path ("3.1.2") instead of building `ParsedResults`.
+
+    Nested messages contribute the values inside them. Bytes left over in a message, e.g. a binary payload that
+    is neither UTF-8 nor a message, are reported as "remain_data" under the path of that message followed by
+    REMAIN_DATA_KEY ("3.$remain"), just REMAIN_DATA_KEY for the top-level message. Field paths never contain
+    "$", so left over bytes don't mix with the values of a field.
+    """
+    REMAIN_DATA_KEY = "$remain"
+
+    def __init__(self, strict: bool = False, stats: ParserStats = None, lazy_strings: bool = False,
+                 recover: bool = False):
+        super().__init__(strict=strict, stats=stats, lazy_strings=lazy_strings, recover=recover)
+        self._sink = None
+        self._prefix = ""
+        self._prefixes = []
+        # occurrences per field in the current message, None unless nested messages are indexed
+        self._occurrences = None
+        self._index_occurrences = False
+
+    def parse_paths(self, data: Union[bytes, bytearray, memoryview],
+                    sink: Callable[[str, str, ParsedDataType], None], index_occurrences: bool = False):
+        """
+        Decode `data`, calling `sink(path, wire_type, value)` for each value in the order of the message.
+
+        All occurrences of a repeated nested message share its path unless `index_occurrences` is set,
+        then later ones are numbered like `ParsedResults.find` paths, "3[1].2" is field 2 of the second field 3.
+        """
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        self._sink = sink
+        self._index_occurrences = index_occurrences
+        try:
+            self._run(data)
+            if self._t.has_remain_data(self._end):
+                sink(self.REMAIN_DATA_KEY, "remain_data", data[self._t.offset:self._end])
+        finally:
+            self._sink = None
+
+    def parse_flat(self, data: Union[bytes, bytearray, memoryview]) -> Dict[str, Union[ParsedDataType, list]]:
+        """
+        Decode `data` into a mapping of dotted field path to value, or to a list of values for repeated fields.
+
+        Paths select messages like `ParsedResults.find`: "3.1" is field 1 of the first field 3 and
+        "3[1].1" field 1 of the second one.
+        """
+        flat = {}
+        repeated = set()
+
+        def sink(path: str, wire_type: str, value: ParsedDataType):
+            if path not in flat:
+                flat[path] = value
+            elif path in repeated:
+                flat[path].append(value)
+            else:
+                flat[path] = [flat[path], value]
+                repeated.add(path)
+
+        self.parse_paths(data, sink, index_occurrences=True)
+        return flat
+
+    def _parse(self, data: bytes) -> ParsedResults:
+        # behind parse(), parse_bytes(), iter_stream() and the other Parser entry points
+        raise TypeError(f"{self.__class__.__name__} builds no ParsedResults, use parse_paths() or parse_flat()")
+
+    def _reset(self):
+        super()._reset()
+        self._prefix = ""
+        self._prefixes = []
+        self._occurrences = {} if self._index_occurrences else None
+
+    def _append_result(self, wire_type: str, data: ParsedDataType, end: int):
+        field = self._target_field
+        if self._occurrences is not None:
+            self._occurrences[field] = self._occurrences.get(field, 0) + 1
+        self._sink(self._prefix + str(field), wire_type, data)
+
+    def _push_frame(self, end, subtree_key: tuple = None):
+        field = self._target_field
+        self._prefixes.append((self._prefix, self._occurrences))
+        if self._occurrences is None:
+            self._prefix = f"{self._prefix}{field}."
+        else:
+            occurrence = self._occurrences.get(field, 0)
+            self._occurrences[field] = occurrence + 1
+            self._prefix = f"{self._prefix}{field}[{occurrence}]." if occurrence else f"{self._prefix}{field}."
+            self._occurrences = {}
+        super()._push_frame(end)
+
+    def _pop_frame(self):
+        self._assert_done()
+        if self._t.has_remain_data(self._end):
+            if self._stats is not None:
+                self._stats.nested_fallbacks += 1
+            self._sink(self._prefix + self.REMAIN_DATA_KEY, "remain_data", self._data[self._t.offset:self._end])
+
+        frame = self._frames.pop()
+        self._prefix, self._occurrences = self._prefixes.pop()
+        self._t = frame.transaction
+        self._end = frame.end
+        self._state = State.FIND_FIELD
+        self._t.done(self._offset)
+
+
+class StreamParser:
+    """
+    Decodes one message from a stream of chunks with bounded memory.
+
+    Top-level field boundaries are tracked by a resumable state machine, and every completed field is
+    decoded by `parser` and released, so only the current chunk and one unfinished field stay in memory.
+    Decoding stops at the first undecodable top-level field, `remain_offset` is its offset in the stream.
+    """
+    DEFAULT_CHUNK_SIZE = 1 << 20
+
+    def __init__(self, parser: Parser = None, chunk_size: int = None):
+        self._parser = parser if parser is not None else Parser()
+        # the top-level state machine below stops at an invalid field instead of resynchronizing
+        if self._parser._recover:
+            raise ValueError("StreamParser can't be used with a recover parser")
+        self._chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+        self._pending = bytearray()
+        self._offset = 0
+        self._state = State.FIND_FIELD
+        self._varint = 0
+        self._shift = 0
+        self._remaining = 0
+        self._remain_offset = None
+        self._peak_buffered_bytes = 0
 
-            elif self._state == State.GET_DELIMITED_DATA:
-                self._get_delimited_data_handler(chunk)
+    @property
+    def remain_offset(self) -> Union[int, None]:
+        return self._remain_offset
 
-            elif self._state == State.PARSE_BIT64:
-                self._fetcher.fetch_64bits()
-                self._parse_fixed_handler(chunk)
+    @property
+    def has_remain_data(self):
+        return self._remain_offset is not None
 
-            elif self._state == State.PARSE_BIT32:
-                self._fetcher.fetch_32bits()
-                self._parse_fixed_handler(chunk)
+    @property
+    def peak_buffered_bytes(self):
+        return self._peak_buffered_bytes
+
+    def feed(self, data: bytes) -> List[ParsedResult]:
+        if self._state == State.TERMINATED:
+            return []
+
+        pending = self._pending
+        position = len(pending)
+        pending += data
+        end = len(pending)
+        self._peak_buffered_bytes = max(self._peak_buffered_bytes, end)
+
+        complete = 0
+        while position < end:
+            if self._state in (State.GET_DELIMITED_DATA, State.PARSE_BIT64, State.PARSE_BIT32):
+                size = min(self._remaining, end - position)
+                position += size
+                self._remaining -= size
+                if self._remaining == 0:
+                    complete = position
+                    self._state = State.FIND_FIELD
+                continue
 
-            elif self._state in (State.PARSE_START_GROUP, State.PARSE_END_GROUP):
+            chunk = pending[position]
+            position += 1
+            self._varint |= (chunk & 0x7F) << self._shift
+            if chunk & 0x80:
+                self._shift += 7
                 continue
 
-            elif self._state == State.TERMINATED:
-                pass
+            value = self._varint
+            self._varint = 0
+            self._shift = 0
 
-            else:
-                raise ValueError(f"Unsupported State {self._state}")
+            if self._state == State.FIND_FIELD:
+                self._find_field(value & 0x7)
+                if self._state == State.TERMINATED:
+                    break
+            elif self._state == State.PARSE_VARINT:
+                complete = position
+                self._state = State.FIND_FIELD
+            elif self._state == State.PARSE_LENGTH_DELIMITED:
+                self._remaining = value
+                if value == 0:
+                    complete = position
+                    self._state = State.FIND_FIELD
+                else:
+                    self._state = State.GET_DELIMITED_DATA
+
+        results = []
+        if complete:
+            # decoded in place, the view is released before the buffer is resized
+            # offsets are tracked from the start of the stream
+            self._parser._base_offset = self._offset
+            try:
+                with memoryview(pending)[:complete] as completed:
+                    results = self._parser._parse(completed).results
+            finally:
+                self._parser._base_offset = 0
+            del pending[:complete]
+            self._offset += complete
+
+        if self._state == State.TERMINATED:
+            self._remain_offset = self._offset
+            pending.clear()
+
+        return list(results)
+
+    def _find_field(self, wire_type):
+        if wire_type == WireType.VARINT.value:
+            self._state = State.PARSE_VARINT
+        elif wire_type == WireType.LEN.value:
+            self._state = State.PARSE_LENGTH_DELIMITED
+        elif wire_type == WireType.I64.value:
+            self._remaining = 8
+            self._state = State.PARSE_BIT64
+        elif wire_type == WireType.I32.value:
+            self._remaining = 4
+            self._state = State.PARSE_BIT32
+        elif wire_type in (WireType.SGROUP.value, WireType.EGROUP.value):
+            self._state = State.TERMINATED
+        else:
+            if self._parser._is_strict:
+                raise AssertionError(f"Invalid wire_type: {wire_type}")
+            self._state = State.TERMINATED
 
-        if self._is_strict:
-            assert self._t.is_done, "parsing process is not done, Maybe invalid protobuf"
+    def finish(self) -> Union[int, None]:
+        """
+        Signal the end of the stream, returns `remain_offset`.
+        """
+        if self._pending:
+            self._remain_offset = self._offset
+            self._pending.clear()
+        if self._parser._is_strict:
+            assert self._remain_offset is None, "parsing process is not done, Maybe invalid protobuf"
+        return self._remain_offset
+
+    def iter_fields(self, fp) -> Iterator[ParsedResult]:
+        while self._state != State.TERMINATED:
+            data = fp.read(self._chunk_size)
+            if not data:
+                break
+            yield from self.feed(data)
+        self.finish()
+
+    def parse(self, fp, callback) -> Union[int, None]:
+        """
+        Call `callback` with every top-level field of the message in `fp`, returns `remain_offset`.
+        """
+        for result in self.iter_fields(fp):
+            callback(result)
+        return self._remain_offset
+
+
+@dataclass
+class GrpcFrame:
+    flags: int
+    payload: bytes
+    message: ParsedResults = None
+    trailers: dict = None
+
+    @property
+    def is_compressed(self):
+        return bool(self.flags & GrpcFrameDecoder.COMPRESSED_FLAG)
+
+    @property
+    def is_trailers(self):
+        return bool(self.flags & GrpcFrameDecoder.TRAILERS_FLAG)
+
+
+class GrpcFrameDecoder:
+    """
+    Splits gRPC length-prefixed frames (1 flags byte and a 4-byte big-endian length) from a byte stream.
+
+    Chunks can be split anywhere, e.g. captured HTTP/2 DATA payloads. Compressed frames are inflated with
+    `encoding` ("gzip" or "deflate") and message payloads are decoded with `parser` unless
+    `decode_messages` is False. gRPC-Web trailers frames (flag 0x80) are parsed into a dict instead.
+    Decompressed payloads larger than `max_message_length` raise ValueError.
+    """
+    HEADER_SIZE = 5
+    COMPRESSED_FLAG = 0x01
+    TRAILERS_FLAG = 0x80
+    ENCODINGS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+    def __init__(self, parser: Parser = None, encoding: str = "gzip", max_message_length: int = None,
+                 decode_messages: bool = True):
+        if encoding not in self.ENCODINGS:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+        self._parser = parser if parser is not None else Parser()
+        self._decode_messages = decode_messages
+        self._wbits = self.ENCODINGS[encoding]
+        self._max_message_length = max_message_length
+        self._pending = bytearray()
+        self._offset = 0
 
-        return self._create_parsed_results()
+    @property
+    def has_remain_data(self):
+        return len(self._pending) > 0
+
+    def feed(self, data: bytes) -> List[GrpcFrame]:
+        pending = self._pending
+        pending += data
+        frames = []
+        position = 0
+        while len(pending) - position >= self.HEADER_SIZE:
+            flags = pending[position]
+            length = int.from_bytes(pending[position + 1:position + self.HEADER_SIZE], "big")
+            if not flags & self.COMPRESSED_FLAG and self._max_message_length is not None \
+                    and length > self._max_message_length:
+                # rejected from the header, the frame is never buffered
+                raise ValueError(f"gRPC message larger than {self._max_message_length} bytes")
+            frame_end = position + self.HEADER_SIZE + length
+            if frame_end > len(pending):
+                break
+            frames.append(self._decode_frame(flags, bytes(pending[position + self.HEADER_SIZE:frame_end])))
+            position = frame_end
+
+        del pending[:position]
+        self._offset += position
+        return frames
+
+    def finish(self) -> Union[int, None]:
+        """
+        Signal the end of the stream, returns the offset of an incomplete frame if any.
+        """
+        if not self._pending:
+            return None
+        self._pending.clear()
+        if self._parser._is_strict:
+            raise AssertionError(f"Truncated gRPC frame at offset {self._offset}")
+        return self._offset
+
+    def iter_frames(self, fp, chunk_size: int = 1 << 16) -> Iterator[GrpcFrame]:
+        while True:
+            data = fp.read(chunk_size)
+            if not data:
+                break
+            yield from self.feed(data)
+        self.finish()
+
+    def decode(self, data: bytes) -> List[GrpcFrame]:
+        frames = self.feed(data)
+        self.finish()
+        return frames
+
+    def _decode_frame(self, flags: int, payload: bytes) -> GrpcFrame:
+        if flags & self.COMPRESSED_FLAG:
+            payload = self._decompress(payload)
+        elif self._max_message_length is not None and len(payload) > self._max_message_length:
+            raise ValueError(f"gRPC message larger than {self._max_message_length} bytes")
+
+        if flags & self.TRAILERS_FLAG:
+            return GrpcFrame(flags=flags, payload=payload, trailers=self._parse_trailers(payload))
+        if not self._decode_messages:
+            return GrpcFrame(flags=flags, payload=payload)
+        return GrpcFrame(flags=flags, payload=payload, message=self._parser.parse_bytes(payload))
+
+    def _decompress(self, payload: bytes) -> bytes:
+        decompressor = zlib.decompressobj(self._wbits)
+        try:
+            if self._max_message_length is None:
+                data = decompressor.decompress(payload) + decompressor.flush()
+            else:
+                # inflate at most one byte more than allowed, so compression bombs are never expanded in full
+                data = decompressor.decompress(payload, self._max_message_length + 1)
+        except zlib.error as error:
+            raise ValueError(f"Invalid compressed gRPC frame: {error}") from None
+        if self._max_message_length is not None and len(data) > self._max_message_length:
+            raise ValueError(f"gRPC message larger than {self._max_message_length} bytes")
+        if not decompressor.eof:
+            raise ValueError("Truncated compressed gRPC frame")
+        return data
+
+    @staticmethod
+    def _parse_trailers(payload: bytes) -> dict:
+        trailers = {}
+        for line in payload.decode("utf-8", "replace").splitlines():
+            name, separator, value = line.partition(":")
+            if separator:
+                trailers[name.strip().lower()] = value.strip()
+        return trailers
@@ -13,6 +13,11 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/dannyhann/protobuf_decoder",
     packages=setuptools.find_packages(),
+    entry_points={
+        "console_scripts": [
+            "protobuf-decoder=protobuf_decoder.cli:main",
+        ],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -1,6 +1,18 @@
 import pytest
+import gzip
+import io
+import json
 import math
-from protobuf_decoder.protobuf_decoder import Utils, Parser, ParsedResult, ParsedResults, FixedBitsValue
+import re
+import shutil
+import subprocess
+import tracemalloc
+import zlib
+from array import array
+from dataclasses import FrozenInstanceError
+from protobuf_decoder.protobuf_decoder import Utils, Parser, ParsedResult, ParsedResults, FixedBitsValue, DecodeCache, \
+    set_decode_cache, ParserStats, LazyString, StreamParser, patch, \
+    diff, TreeRenderer, write_decode_raw, find_messages, GrpcFrameDecoder, FieldPathParser
 
 
 def test_binary_validate():
@@ -1968,3 +1980,946 @@ def test_remain_protobuf_2():
     assert parsed_data.to_dict() == {'remain_data': '67 72 70 63 2d 73 74 61 74 75 73 3a 30 0d',
                                      'results': [{'data': 0, 'field': 0, 'wire_type': 'varint'},
                                                  {'data': 15, 'field': 0, 'wire_type': 'varint'}]}
+
+
+def test_to_dict_deep_nested():
+    parsed_data = ParsedResults([ParsedResult(field=1, wire_type='varint', data=1)])
+    for _ in range(5000):
+        parsed_data = ParsedResults([ParsedResult(field=1, wire_type='length_delimited', data=parsed_data)])
+
+    dict_result = parsed_data.to_dict()
+    for _ in range(5000):
+        dict_result = dict_result['results'][0]['data']
+    assert dict_result == {'results': [{'field': 1, 'wire_type': 'varint', 'data': 1}]}
+
+
+def test_parsed_results_view():
+    test_target = "08 96 01 1a 03 08 96 01 25 00 00 80 3f 0d 1d"
+    parsed_data = Parser().parse(test_target)
+    view = parsed_data.view()
+
+    assert view == parsed_data.to_dict()
+    assert list(view) == ['results', 'remain_data']
+    assert view['remain_data'] == '0d 1d'
+    assert len(view['results']) == 3
+    assert view['results'][0]['data'] == 150
+    assert view['results'][1]['data']['results'][0] == {'field': 1, 'wire_type': 'varint', 'data': 150}
+    assert view['results'][2]['data'] == parsed_data[2].data.to_dict()
+    assert parsed_data[1].view() == parsed_data[1].to_dict()
+    assert 'remain_data' not in view['results'][1]['data']
+    with pytest.raises(KeyError):
+        view['missing']
+
+
+def _encode_varint(value):
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def test_deep_nested_protobuf():
+    depth = 10000
+    message = bytes.fromhex("08 96 01")
+    for _ in range(depth):
+        message = b"\x0a" + _encode_varint(len(message)) + message
+
+    parsed_data = Parser().parse(message.hex())
+    for _ in range(depth):
+        assert len(parsed_data.results) == 1
+        assert parsed_data[0].field == 1
+        assert parsed_data[0].wire_type == 'length_delimited'
+        parsed_data = parsed_data[0].data
+    assert parsed_data == ParsedResults([ParsedResult(field=1, wire_type='varint', data=150)])
+
+
+def test_decode_cache():
+    cache = DecodeCache(max_entries=2)
+    parser = Parser(cache=cache)
+
+    parsed_data = parser.parse("08 96 01 1a 03 08 96 01")
+    assert parsed_data == Parser().parse("08 96 01 1a 03 08 96 01")
+    assert parser.parse("0896011a03089601") is parsed_data
+    assert Parser(cache=cache).parse("08 96 01 1a 03 08 96 01") is parsed_data
+    assert (cache.hits, cache.misses, len(cache)) == (2, 1, 1)
+
+    with pytest.raises(FrozenInstanceError):
+        parsed_data[0].data = 1
+    with pytest.raises(FrozenInstanceError):
+        parsed_data[1].data.remain_data = "00"
+    with pytest.raises(AttributeError):
+        parsed_data.results.append(ParsedResult(field=1, wire_type='varint', data=1))
+
+    parser.parse("08 01")
+    parser.parse("08 02")
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert parser.parse("08 96 01 1a 03 08 96 01") is not parsed_data
+
+    cache = DecodeCache(max_entries=None, max_bytes=4)
+    parser = Parser(cache=cache)
+    parser.parse("08 01")
+    parser.parse("08 02")
+    parser.parse("08 03")
+    assert cache.to_dict() == dict(entries=2, bytes=4, hits=0, misses=3, evictions=1)
+
+
+def test_decode_cache_strict_and_default():
+    cache = DecodeCache()
+    set_decode_cache(cache)
+    try:
+        test_target = "02 04 74 65 73 74 02 05 74 65 73 74 32 00 00 00 00 0d 1d"
+        assert Parser().parse(test_target).remain_data == '0d 1d'
+        with pytest.raises(AssertionError):
+            Parser(strict=True).parse(test_target)
+        assert Parser().parse(test_target) is Parser().parse(test_target)
+        assert cache.hits == 2
+    finally:
+        set_decode_cache(None)
+
+
+def test_memoize_subtrees():
+    test_target = " ".join(["0a 06 08 01 12 02 08 02"] * 3 + ["10 01"])
+    parsed_data = Parser(memoize_subtrees=True).parse(test_target)
+    assert parsed_data == Parser().parse(test_target)
+    assert parsed_data[0].data is parsed_data[1].data is parsed_data[2].data
+
+    subtree_cache = DecodeCache(max_entries=16)
+    parser = Parser(subtree_cache=subtree_cache)
+    first = parser.parse(test_target)
+    second = parser.parse("1a 06 08 01 12 02 08 02")
+    assert second[0].data is first[0].data
+    assert first[0].data[1].data is second[0].data[1].data
+    assert first[0].data.is_frozen
+    assert subtree_cache.hits == 1
+
+
+@pytest.mark.parametrize("memoize_subtrees", [False, True])
+def test_deep_nesting_memory(memoize_subtrees):
+    message = b"\x08\x01"
+    for _ in range(2000):
+        message = b"\x0a" + Utils.encode_varint(len(message)) + message
+
+    tracemalloc.start()
+    try:
+        Parser(memoize_subtrees=memoize_subtrees).parse_bytes(message)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # frames must not keep a copy of every enclosing payload, which would take about 6 MB here
+    assert peak < 2_000_000
+
+
+def test_benchmark_corpus_and_report():
+    from protobuf_decoder import benchmark
+
+    corpus = benchmark.generate_corpus(seed=1)
+    assert corpus == benchmark.generate_corpus(seed=1)
+    assert set(corpus) == set(benchmark.SHAPES)
+
+    report = benchmark.run(seed=1, repeat=1, shapes=("wide_flat", "deep_nested"), input_formats=("base64", "xxd"))
+    assert [(result['shape'], result['operation']) for result in report['results']] == [
+        ('wide_flat', 'parse'), ('wide_flat', 'to_dict'), ('wide_flat', 'show_parsed_results'),
+        ('wide_flat', 'to_bytes'),
+        ('deep_nested', 'parse'), ('deep_nested', 'to_dict'), ('deep_nested', 'show_parsed_results'),
+        ('deep_nested', 'to_bytes'),
+    ]
+    assert report['results'][0]['fields'] == 1000
+    assert report['results'][0]['p50_ms'] > 0
+    assert [result['input_format'] for result in report['input_conversion']] == ['base64', 'xxd']
+
+    data = corpus['wide_flat']
+    assert Utils.dump_to_bytes(benchmark.format_xxd(data)) == data
+    assert Utils.dump_to_bytes(benchmark.format_hexdump(data)) == data
+
+
+def test_parser_stats():
+    stats = ParserStats()
+    parser = Parser(stats=stats)
+    assert parser.stats is stats
+
+    parser.parse("08 96 01 12 04 74 65 73 74 1a 05 08 01 12 01 ff 21 00 00 00 00 00 00 f0 3f")
+    assert stats.state_calls['FIND_FIELD'] == 7
+    assert stats.state_calls['PARSE_VARINT'] == 2
+    assert stats.state_calls['PARSE_BIT64'] == 1
+    assert stats.bytes_per_wire_type == dict(tag=7, varint=3, length_delimited=7, fixed64=8, fixed32=0,
+                                            group=0, terminated=0)
+    assert stats.nested_attempts == 2
+    assert stats.nested_fallbacks == 1
+    assert stats.nested_checks == 3
+    assert stats.nested_check_seconds > 0
+    assert stats.peak_depth == 2
+
+    dict_stats = stats.to_dict()
+    assert dict_stats['nested_attempts'] == 2
+    assert dict_stats['state_calls']['PARSE_LENGTH_DELIMITED'] == 3
+
+    stats.reset()
+    assert stats.to_dict()['bytes_per_wire_type']['tag'] == 0
+
+
+def test_remain_data_in_nested_and_truncated_payload():
+    parsed_data = Parser().parse("1a 04 08 01 10 96 0a 05 74 65")
+    assert parsed_data == ParsedResults(
+        results=[
+            ParsedResult(field=3, wire_type='length_delimited', data=ParsedResults(
+                results=[ParsedResult(field=1, wire_type='varint', data=1)], remain_data='10 96')),
+        ],
+        remain_data='74 65'
+    )
+
+
+def test_track_offsets():
+    test_target = "08 96 01 1a 03 08 96 01 0a 00 21 00 00 00 00 00 00 f0 3f 80 01 01 12 02 68 69"
+    data = bytes.fromhex(test_target)
+    parsed_data = Parser(track_offsets=True).parse(test_target)
+
+    offsets = [(result.offset, result.value_offset, result.value_length) for result in parsed_data.results]
+    assert offsets == [(0, 1, 2), (3, 5, 3), (8, 10, 0), (10, 11, 8), (19, 21, 1), (22, 24, 2)]
+    nested = parsed_data[1].data[0]
+    assert (nested.offset, nested.value_offset, nested.value_length) == (5, 6, 2)
+    assert parsed_data[5].value_view(data).tobytes() == b"hi"
+    assert parsed_data[1].value_view(data).tobytes() == bytes.fromhex("08 96 01")
+
+    assert parsed_data.to_dict(with_offsets=True)['results'][1] == {
+        'field': 3, 'wire_type': 'length_delimited', 'offset': 3, 'value_offset': 5, 'value_length': 3,
+        'data': {'results': [{'field': 1, 'wire_type': 'varint', 'data': 150,
+                              'offset': 5, 'value_offset': 6, 'value_length': 2}]}}
+    assert parsed_data.to_dict() == Parser().parse(test_target).to_dict()
+    assert parsed_data[0].to_dict(with_offsets=True)['value_offset'] == 1
+
+    assert Parser().parse(test_target)[0].offset is None
+    with pytest.raises(ValueError):
+        Parser().parse(test_target)[0].value_view(data)
+    with pytest.raises(ValueError):
+        Parser(track_offsets=True, memoize_subtrees=True)
+
+
+def test_parsed_results_field_lookup():
+    test_target = "08 01 1a 07 08 02 12 03 10 96 01 1a 02 08 03 10 04 08 05"
+    parsed_data = Parser().parse(test_target)
+
+    assert parsed_data.get(1) == ParsedResult(field=1, wire_type='varint', data=1)
+    assert [result.data for result in parsed_data.get_all(1)] == [1, 5]
+    assert parsed_data.get(9) is None
+    assert parsed_data.get_all(9) == []
+
+    assert parsed_data.find("3.2.2") == ParsedResult(field=2, wire_type='varint', data=150)
+    assert parsed_data.find("3[1].1").data == 3
+    assert parsed_data.find("1[1]").data == 5
+    assert parsed_data.find("3[2].1") is None
+    assert parsed_data.find("1.1") is None
+    with pytest.raises(ValueError):
+        parsed_data.find("3.a")
+
+    parsed_data.results.append(ParsedResult(field=9, wire_type='varint', data=9))
+    assert parsed_data.get(9).data == 9
+
+    frozen = Parser(cache=DecodeCache()).parse(test_target)
+    assert frozen.find("3.2.2").data == 150
+
+
+def test_lazy_strings():
+    test_target = "0a 09 ED 85 8C EC 8A A4 ED 8A B8 12 04 74 65 73 74 1a 00 22 03 0a 01 61"
+    parsed_data = Parser(lazy_strings=True).parse(test_target)
+
+    lazy_string = parsed_data[1].data
+    assert isinstance(lazy_string, LazyString)
+    assert not lazy_string.is_decoded
+    assert lazy_string.bytes == b"test"
+    assert not lazy_string.is_decoded
+    assert lazy_string == "test"
+    assert lazy_string.is_decoded
+    assert str(parsed_data[0].data) == '테스트'
+    assert parsed_data[2].data == ""
+    assert parsed_data.find("4.1").data.bytes == b"a"
+    assert {lazy_string: 1}["test"] == 1
+    assert parsed_data.view()['results'][1]['data'] == "test"
+    assert parsed_data == Parser().parse(test_target)
+    assert parsed_data.to_dict() == Parser().parse(test_target).to_dict()
+
+
+def test_parse_input_formats():
+    expected = Parser().parse("08 96 01 12 04 74 65 73 74")
+
+    assert Parser().parse_bytes(bytes.fromhex("0896011204 74657374")) == expected
+    assert Parser().parse_bytes(memoryview(b"\x00\x08\x96\x01\x12\x04test")[1:]) == expected
+    assert Parser().parse_hex("08:96:01:12:04:74:65:73:74") == expected
+    assert Parser().parse_hex("0x08, 0x96, 0x01, 0x12, 0x04, 0x74, 0x65, 0x73, 0x74") == expected
+    assert Parser().parse_hex("\\x08\\x96\\x01\\x12\\x04\\x74\\x65\\x73\\x74") == expected
+    assert Parser().parse_hex("08-96-01\n12-04-74-65-73-74") == expected
+    assert Parser().parse_base64("CJYBEgR0ZXN0") == expected
+    assert Parser().parse_base64("CJYB\nEgR0ZXN0==") == expected
+    assert Utils.base64_to_bytes("_-8") == b"\xff\xef"
+
+    xxd = "00000000: 0896 0112 0474 6573 74                   .....test\n"
+    assert Parser().parse_dump(xxd) == expected
+
+    hexdump = (
+        "00000000  08 96 01 12 04 74 65 73  74 00 00 00 00 00 00 00  |.....test.......|\n"
+        "00000010  00 00 00 00 00 00 00 00  00 00 00 00 00 00 00 00  |................|\n"
+        "*\n"
+        "00000040  00 00 01                                          |...|\n"
+        "00000043\n"
+    )
+    assert Utils.dump_to_bytes(hexdump) == bytes.fromhex("08 96 01 12 04 74 65 73 74") + bytes(57) + b"\x01"
+
+    with pytest.raises(ValueError):
+        Parser().parse_hex("08 9")
+    with pytest.raises(ValueError):
+        Parser().parse_base64("CJY!")
+    with pytest.raises(ValueError):
+        Parser().parse_dump("not a dump")
+
+    # "0x" is only stripped as the prefix of a byte
+    assert Utils.hex_to_bytes("0x08 0X96,0x01") == b"\x08\x96\x01"
+    with pytest.raises(ValueError):
+        Utils.hex_to_bytes("a0x1")
+    with pytest.raises(ValueError):
+        Utils.hex_to_bytes("0 896")
+
+    # padding is only added to unpadded input
+    assert Utils.base64_to_bytes("YQ") == Utils.base64_to_bytes("YQ==") == b"a"
+    with pytest.raises(ValueError):
+        Utils.base64_to_bytes("YQ=")
+
+    # plain hex has neither the xxd colon nor the hexdump -C text column
+    for text in ("08 96 01 12 04", "0896", "00000000\n"):
+        with pytest.raises(ValueError):
+            Utils.dump_to_bytes(text)
+
+
+def test_cli(tmp_path, capsys):
+    from protobuf_decoder import cli
+
+    paths = []
+    for value in (1, 2, 3):
+        path = tmp_path / f"message{value}.hex"
+        path.write_text(f"08 0{value}\n")
+        paths.append(str(path))
+
+    assert cli.main(["-o", "ndjson", "-j", "2", "--stats"] + paths) == 0
+    captured = capsys.readouterr()
+    assert captured.out.splitlines() == [
+        '{"results": [{"field": 1, "wire_type": "varint", "data": %d}]}' % value for value in (1, 2, 3)
+    ]
+    assert "3 messages" in captured.err
+
+    delimited = tmp_path / "messages.bin"
+    delimited.write_bytes(b"\x03\x08\x96\x01" + b"\x06\x0a\x04test")
+    assert cli.main(["-f", "delimited", "-o", "tree", str(delimited)]) == 0
+    assert capsys.readouterr().out == " [1: varint] => 150\n [1: string] => test\n"
+    assert cli.main(["-f", "delimited", "-o", "tree", "--max-string-length", "2", str(delimited)]) == 0
+    assert capsys.readouterr().out == " [1: varint] => 150\n [1: string] => te... [truncated, 4 bytes]\n"
+
+    raw = tmp_path / "nested.bin"
+    raw.write_bytes(bytes.fromhex("1a 03 08 96 01"))
+    assert cli.main(["-f", "raw", str(raw)]) == 0
+    assert json.loads(capsys.readouterr().out) == Parser().parse("1a 03 08 96 01").to_dict()
+    assert cli.main(["-f", "raw", "-o", "flat", str(raw)]) == 0
+    assert capsys.readouterr().out == '{"3.1": 150}\n'
+
+    truncated = tmp_path / "truncated.hex"
+    truncated.write_text("08")
+    assert cli.main(["--strict", "-o", "ndjson", str(tmp_path / "missing.hex"), str(truncated), paths[0]]) == 1
+    captured = capsys.readouterr()
+    assert "missing.hex" in captured.err
+    assert "truncated.hex: parsing process is not done" in captured.err
+    assert captured.out.splitlines() == ['{"results": [{"field": 1, "wire_type": "varint", "data": 1}]}']
+
+
+def test_custom_is_maybe_nested_protobuf():
+    class StringParser(Parser):
+        @staticmethod
+        def is_maybe_nested_protobuf(string_or_not) -> bool:
+            return not string_or_not.startswith("08")
+
+    assert StringParser().parse("1a 02 08 01 12 02 10 01") == ParsedResults([
+        ParsedResult(field=3, wire_type='string', data='\x08\x01'),
+        ParsedResult(field=2, wire_type='length_delimited', data=ParsedResults([
+            ParsedResult(field=2, wire_type='varint', data=1)
+        ])),
+    ])
+
+    set_decode_cache(DecodeCache())
+    try:
+        assert Parser().parse("0a 02 08 01")[0].wire_type == "length_delimited"
+        assert StringParser().parse("0a 02 08 01")[0].wire_type == "string"
+    finally:
+        set_decode_cache(None)
+
+
+def test_stream_parser():
+    test_target = "08 96 01 12 04 74 65 73 74 1a 05 08 01 12 01 61 21 00 00 00 00 00 00 f0 3f 0a 00 80 01 01"
+    data = bytes.fromhex(test_target)
+    expected = Parser().parse(test_target)
+
+    for chunk_size in (1, 3, 7, 1024):
+        stream_parser = StreamParser(chunk_size=chunk_size)
+        results = list(stream_parser.iter_fields(io.BytesIO(data)))
+        assert [result.to_dict() for result in results] == expected.to_dict()['results']
+        assert stream_parser.remain_offset is None
+
+    stream_parser = StreamParser(chunk_size=4)
+    results = []
+    assert stream_parser.parse(io.BytesIO(bytes.fromhex("08 96 01") * 1000), results.append) is None
+    assert len(results) == 1000
+    assert stream_parser.peak_buffered_bytes <= 4 + 2
+
+    stream_parser = StreamParser(chunk_size=4)
+    results = list(stream_parser.iter_fields(io.BytesIO(bytes.fromhex("08 01 12 f0 07 74 65") + bytes(100))))
+    assert results == [ParsedResult(field=1, wire_type='varint', data=1)]
+    assert stream_parser.remain_offset == 2
+
+    fields = list(Parser().iter_stream(io.BytesIO(bytes.fromhex("08 01 0a 03 61 62")), chunk_size=2))
+    assert fields == [ParsedResult(field=1, wire_type='varint', data=1)]
+
+    stream_parser = StreamParser(chunk_size=2)
+    fields = list(stream_parser.iter_fields(io.BytesIO(bytes.fromhex("08 01 10 02 0f 67 72 70 63"))))
+    assert [field.data for field in fields] == [1, 2]
+    assert stream_parser.remain_offset == 4
+
+    with pytest.raises(AssertionError):
+        list(Parser(strict=True).iter_stream(io.BytesIO(bytes.fromhex("08 01 0f"))))
+    with pytest.raises(AssertionError):
+        list(Parser(strict=True).iter_stream(io.BytesIO(bytes.fromhex("08 01 0a 03 61"))))
+
+
+def test_stream_parser_offsets():
+    test_target = "08 01 12 05 68 65 6c 6c 6f 1a 05 08 01 12 01 61 21 00 00 00 00 00 00 f0 3f"
+    expected = Parser(track_offsets=True).parse(test_target).to_dict(with_offsets=True)['results']
+
+    for chunk_size in (1, 4, 1024):
+        stream_parser = StreamParser(Parser(track_offsets=True), chunk_size=chunk_size)
+        results = list(stream_parser.iter_fields(io.BytesIO(bytes.fromhex(test_target))))
+        assert [result.to_dict(with_offsets=True) for result in results] == expected
+
+    with pytest.raises(ValueError):
+        StreamParser(Parser(recover=True))
+
+
+def test_stream_parser_huge_field_memory():
+    size = 1 << 22
+    data = b"\x0a" + Utils.encode_varint(size) + b"a" * size
+    stream_parser = StreamParser(Parser(lazy_strings=True), chunk_size=1 << 20)
+
+    tracemalloc.start()
+    try:
+        results = list(stream_parser.iter_fields(io.BytesIO(data)))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert results == [ParsedResult(field=1, wire_type='string', data=LazyString(b"a" * size))]
+    # the pending buffer and the decoded value, the completed field isn't copied in between
+    assert peak < 2.5 * size
+
+
+@pytest.mark.parametrize("test_target", [
+    "08 96 01 12 04 74 65 73 74",
+    "12 07 74 65 73 74 69 6e 67",
+    "1a 03 08 96 01",
+    "80 01 01",
+    "0A 09 ED 85 8C EC 8A A4 ED 8A B8",
+    "0a 00 10 ff ff 03 18 17",
+    "0D 6A FF FF FF",
+    "21 4C ED 03 4F 00 CC 00 00",
+    "089404120b180012000a056576656e74",
+    "089247123012040801103d12040803103512040806101012040808100612040804102112040802104712040805102f120408651000",
+    "08 8C 23 12 08 42 04 08 04 10 01 60 00",
+    "02 04 74 65 73 74 02 05 74 65 73 74 32 00 00 00 00 0d 1d",
+    "1a 04 08 01 10 96 0d 05 74",
+])
+def test_to_bytes_round_trip(test_target):
+    data = Utils.hex_to_bytes(test_target)
+    assert Parser().parse(test_target).to_bytes() == data
+    assert Parser(lazy_strings=True, memoize_subtrees=True).parse(test_target).to_bytes() == data
+    assert Parser(cache=DecodeCache()).parse(test_target).to_bytes() == data
+
+
+def test_to_bytes():
+    from protobuf_decoder import benchmark
+
+    for message in benchmark.generate_corpus(seed=2).values():
+        assert Parser().parse(message.hex()).to_bytes() == message
+
+    depth = 10000
+    message = bytes.fromhex("08 96 01")
+    for _ in range(depth):
+        message = b"\x0a" + _encode_varint(len(message)) + message
+    assert Parser().parse(message.hex()).to_bytes() == message
+
+    # overlong varints are written in their shortest form
+    assert Parser().parse("80 00 00 08 80 00").to_bytes() == bytes.fromhex("00 00 08 00")
+
+    parsed_data = ParsedResults([
+        ParsedResult(field=1, wire_type='varint', data=-1),
+        ParsedResult(field=2, wire_type='string', data='\u00e9'),
+        ParsedResult(field=3, wire_type='fixed32', data=1.0),
+        ParsedResult(field=4, wire_type='fixed64', data=FixedBitsValue(bit_value=2, bits=64)),
+        ParsedResult(field=5, wire_type='length_delimited', data=ParsedResults([
+            ParsedResult(field=1, wire_type='string', data=b'\xff'),
+        ], remain_data='0f')),
+    ])
+    assert parsed_data.to_bytes() == bytes.fromhex(
+        "08 ff ff ff ff ff ff ff ff ff 01 12 02 c3 a9 1d 00 00 80 3f 21 02 00 00 00 00 00 00 00 2a 04 0a 01 ff 0f"
+    )
+
+    with pytest.raises(ValueError):
+        ParsedResults([ParsedResult(field=1, wire_type='group', data=1)]).to_bytes()
+
+
+def test_patch():
+    test_target = "08 96 01 22 0b 08 01 12 07 08 01 12 03 61 62 63 22 02 10 05"
+    data = bytes.fromhex(test_target)
+
+    patched = patch(data, "4.2.2", "redacted")
+    assert patched == bytes.fromhex("08 96 01 22 10 08 01 12 0c 08 01 12 08 72 65 64 61 63 74 65 64 22 02 10 05")
+    assert Parser().parse(patched.hex()).find("4.2.2").data == "redacted"
+    assert data == bytes.fromhex(test_target)
+
+    assert patch(data, "4.2.2", None) == bytes.fromhex("08 96 01 22 06 08 01 12 02 08 01 22 02 10 05")
+    assert patch(data, "4[1].2", 1) == bytes.fromhex("08 96 01 22 0b 08 01 12 07 08 01 12 03 61 62 63 22 02 10 01")
+    assert patch(data, "1", 1 << 20) == bytes.fromhex("08 80 80 40") + data[3:]
+    assert patch(data, "4", ParsedResults([ParsedResult(field=1, wire_type='varint', data=2)])) == \
+        bytes.fromhex("08 96 01 22 02 08 02 22 02 10 05")
+
+    # long enough for the length prefixes of both parents to grow
+    patched = patch(data, "4.2.2", "x" * 200)
+    assert Parser().parse(patched.hex()).find("4.2.2").data == "x" * 200
+    assert Parser().parse(patched.hex()).find("4[1].2").data == 5
+
+    buffer = bytearray(data)
+    assert patch(buffer, "4.2.2", "x" * 200) is buffer
+    assert buffer == patched
+
+    with pytest.raises(KeyError):
+        patch(data, "4.3", None)
+    with pytest.raises(KeyError):
+        patch(data, "1.1", None)
+    with pytest.raises(ValueError):
+        patch(bytes.fromhex("0a 03 61 62 63"), "1.1", None)
+    for path, value in (("1", "x"), ("1", 1.5), ("2", 1), ("3", "x")):
+        with pytest.raises(ValueError):
+            patch(bytes.fromhex("08 01 12 01 61 1d 00 00 80 3f"), path, value)
+
+
+def test_diff():
+    a = bytes.fromhex("08 01 12 03 61 62 63 1a 04 08 01 10 02 1a 02 08 05")
+    b = bytes.fromhex("08 01 12 03 61 62 64 1a 04 08 01 10 03 20 07 20 08")
+
+    assert diff(a, a) == []
+    assert diff(a, Parser().parse(a.hex())) == []
+    assert [(field_diff.kind, field_diff.path) for field_diff in diff(a, b)] == [
+        ('changed', '2'), ('changed', '3.2'), ('removed', '3[1]'), ('added', '4'), ('added', '4[1]'),
+    ]
+
+    changed = diff(a, b)[1]
+    assert changed.old == ParsedResult(field=2, wire_type='varint', data=2)
+    assert changed.new == ParsedResult(field=2, wire_type='varint', data=3)
+    assert diff(a, b)[0].to_dict() == {
+        'kind': 'changed', 'path': '2',
+        'old': {'field': 2, 'wire_type': 'string', 'data': 'abc'},
+        'new': {'field': 2, 'wire_type': 'string', 'data': 'abd'},
+    }
+    assert Parser().parse(b.hex()).find(diff(a, b)[1].path).data == 3
+
+    # a string on one side and a message on the other is reported as a whole
+    assert [field_diff.kind for field_diff in diff(bytes.fromhex("0a 02 08 01"), bytes.fromhex("0a 02 68 69"))] == [
+        'changed'
+    ]
+
+    with pytest.raises(ValueError):
+        diff(a, bytes.fromhex("0f"))
+
+
+def test_tree_renderer(capsys):
+    test_target = "08 96 01 12 0a 61 62 63 64 65 66 67 68 69 6a 1a 05 08 01 1a 01 41 20 01 20 02 20 03 20 04 2d ff"
+    parsed_data = Parser().parse(test_target)
+
+    stream = io.StringIO()
+    TreeRenderer().render(parsed_data, stream)
+    Utils.show_parsed_results(parsed_data)
+    assert stream.getvalue() == capsys.readouterr().out
+
+    stream = io.StringIO()
+    TreeRenderer(max_string_length=4, max_repeated=2, max_depth=1, buffer_size=1).render(parsed_data, stream)
+    assert stream.getvalue() == (
+        " [1: varint] => 150\n"
+        " [2: string] => abcd... [truncated, 10 chars]\n"
+        " [3: length_delimited] =>\n"
+        "\t [1: varint] => 1\n"
+        "\t [3: string] => A\n"
+        " [4: varint] => 1\n"
+        " [4: varint] => 2\n"
+        " [4: ...] 2 more\n"
+        " left over bytes: 2d f... [truncated, 5 chars]\n"
+    )
+
+    lazy_data = Parser(lazy_strings=True).parse("0a 06 c3 a9 c3 a9 c3 a9 12 02 08 01 00")
+    stream = io.StringIO()
+    TreeRenderer(max_string_length=2, max_depth=0).render(lazy_data, stream)
+    assert stream.getvalue() == (
+        " [1: string] => \u00e9\u00e9... [truncated, 6 bytes]\n"
+        " [2: length_delimited] => ... [1 fields]\n"
+        " left over bytes: 00\n"
+    )
+    assert not lazy_data[0].data.is_decoded
+
+
+def _decode_raw(data: bytes) -> str:
+    stream = io.StringIO()
+    write_decode_raw(data, stream)
+    return stream.getvalue()
+
+
+def test_write_decode_raw():
+    assert _decode_raw(bytes.fromhex("08 96 01 12 04 74 65 73 74 1a 03 08 96 01 0a 00")) == (
+        '1: 150\n'
+        '2: "test"\n'
+        '3 {\n'
+        '  1: 150\n'
+        '}\n'
+        '1: ""\n'
+    )
+    assert _decode_raw(bytes.fromhex("0d 6a ff ff ff 21 4c ed 03 4f 00 cc 00 00 2a 06 0a 0d 22 27 5c e2")) == (
+        '1: 0xffffff6a\n'
+        '4: 0x0000cc004f03ed4c\n'
+        '5: "\\n\\r\\"\\\'\\\\\\342"\n'
+    )
+    assert _decode_raw(bytes.fromhex("0b 10 01 1b 1c 0c")) == '1 {\n  2: 1\n  3 {\n  }\n}\n'
+
+    # length-delimited fields are expanded 10 levels deep, like protoc
+    message = bytes.fromhex("08 01")
+    for _ in range(11):
+        message = b"\x0a" + _encode_varint(len(message)) + message
+    assert _decode_raw(message).splitlines()[10] == '                    1: "\\010\\001"'
+
+    for invalid in ("0f", "0c", "0b 08 01", "80 80 80 80 10 01", "08 ff ff ff ff ff ff ff ff ff ff 01"):
+        with pytest.raises(ValueError):
+            _decode_raw(bytes.fromhex(invalid))
+
+
+@pytest.mark.skipif(shutil.which("protoc") is None, reason="protoc is not installed")
+def test_write_decode_raw_matches_protoc():
+    with open(__file__) as fp:
+        test_targets = re.findall(r'test_target = "([^"]+)"', fp.read())
+    for test_target in test_targets:
+        is_valid, hex_string = Utils.validate(test_target)
+        if not is_valid:
+            continue
+        data = bytes.fromhex(hex_string)
+        completed = subprocess.run(["protoc", "--decode_raw"], input=data, capture_output=True)
+        if completed.returncode:
+            with pytest.raises(ValueError):
+                _decode_raw(data)
+        else:
+            assert _decode_raw(data) == completed.stdout.decode("ascii")
+
+
+def test_recover():
+    # an invalid wire type and an overrunning length between valid fields
+    test_target = "08 96 01 0f ff 12 04 74 65 73 74 18 05 22 7f 61 62 1a 03 08 96 01"
+    assert Parser().parse(test_target).remain_data == "0f ff 12 04 74 65 73 74 18 05 22 7f 61 62 1a 03 08 96 01"
+
+    parsed_data = Parser(recover=True).parse(test_target)
+    assert parsed_data == ParsedResults([
+        ParsedResult(field=1, wire_type='varint', data=150),
+        ParsedResult(field=2, wire_type='string', data='test'),
+        ParsedResult(field=3, wire_type='varint', data=5),
+        ParsedResult(field=3, wire_type='length_delimited', data=ParsedResults([
+            ParsedResult(field=1, wire_type='varint', data=150),
+        ])),
+    ])
+    assert parsed_data.skipped_ranges == [(3, 5), (13, 17)]
+    assert parsed_data.to_dict()['skipped_ranges'] == [[3, 5], [13, 17]]
+    assert parsed_data.view() == parsed_data.to_dict()
+    assert list(parsed_data.view()) == ["results", "skipped_ranges"]
+
+    parsed_data = Parser(recover=True).parse("08 01 12 7f 61 62")
+    assert parsed_data == ParsedResults([ParsedResult(field=1, wire_type='varint', data=1)], remain_data='12 7f 61 62')
+    assert parsed_data.skipped_ranges is None
+    assert parsed_data.view() == parsed_data.to_dict()
+
+    parsed_data = Parser(recover=True).parse("08 01 " + "ff " * 10000 + "10 02")
+    assert [result.data for result in parsed_data.results] == [1, 2]
+    assert parsed_data.skipped_ranges == [(2, 10002)]
+
+    with pytest.raises(ValueError):
+        Parser(recover=True, strict=True)
+
+
+def test_find_messages():
+    message = bytes.fromhex("08 96 01 12 04 74 65 73 74 1a 03 08 96 01")
+    blob = b"\xff\xff\xff" + message + bytes(64) + b"\x07\x07" + message + b"\xff\xff"
+
+    found = list(find_messages(blob))
+    assert [(offset, length) for offset, length, _ in found] == [(3, len(message)), (len(message) + 69, len(message))]
+    assert found[0][2] == Parser().parse(message.hex())
+    assert [(offset, length) for offset, length, _ in find_messages(memoryview(blob))] == [
+        (offset, length) for offset, length, _ in found
+    ]
+
+    assert list(find_messages(blob, min_fields=4)) == []
+    assert list(find_messages(blob, min_len=15)) == []
+    assert [offset for offset, _, _ in find_messages(blob, min_fields=1, min_len=2)] == [3, len(message) + 69]
+    assert list(find_messages(bytes(1000))) == []
+
+
+def test_grpc_frame_decoder():
+    message = bytes.fromhex("08 96 01 12 04 74 65 73 74")
+    compressed = gzip.compress(message)
+    trailers = b"grpc-status:0\r\ngrpc-message:OK\r\n"
+    data = b"\x00" + len(message).to_bytes(4, "big") + message + \
+        b"\x01" + len(compressed).to_bytes(4, "big") + compressed + \
+        b"\x80" + len(trailers).to_bytes(4, "big") + trailers
+
+    for chunk_size in (1, 7, 1024):
+        frames = list(GrpcFrameDecoder().iter_frames(io.BytesIO(data), chunk_size=chunk_size))
+        assert [(frame.is_compressed, frame.is_trailers) for frame in frames] == [
+            (False, False), (True, False), (False, True),
+        ]
+        assert frames[0].message == frames[1].message == Parser().parse(message.hex())
+        assert frames[1].payload == message
+        assert frames[2].trailers == {'grpc-status': '0', 'grpc-message': 'OK'}
+
+    decoder = GrpcFrameDecoder()
+    assert decoder.feed(data[:8]) == []
+    assert decoder.has_remain_data
+    assert decoder.finish() == 0
+    assert GrpcFrameDecoder(decode_messages=False).decode(data)[0].message is None
+
+    with pytest.raises(AssertionError):
+        GrpcFrameDecoder(parser=Parser(strict=True)).decode(data[:-1])
+    with pytest.raises(ValueError):
+        GrpcFrameDecoder(max_message_length=4).decode(data)
+    bomb = gzip.compress(bytes(1 << 20))
+    with pytest.raises(ValueError):
+        GrpcFrameDecoder(max_message_length=1024).decode(b"\x01" + len(bomb).to_bytes(4, "big") + bomb)
+    with pytest.raises(ValueError):
+        GrpcFrameDecoder().decode(b"\x01\x00\x00\x00\x02ab")
+
+    # an oversized frame is rejected from its header, before its payload arrives
+    with pytest.raises(ValueError):
+        GrpcFrameDecoder(max_message_length=10).feed(b"\x00\xff\xff\xff\xff")
+    for encoding, truncated in (("gzip", compressed[:-4]), ("deflate", zlib.compress(message)[:-3])):
+        with pytest.raises(ValueError):
+            GrpcFrameDecoder(encoding=encoding).decode(b"\x01" + len(truncated).to_bytes(4, "big") + truncated)
+        with pytest.raises(ValueError):
+            GrpcFrameDecoder(encoding=encoding, max_message_length=1024).decode(
+                b"\x01" + len(truncated).to_bytes(4, "big") + truncated)
+    with pytest.raises(ValueError):
+        GrpcFrameDecoder(encoding="snappy")
+
+
+def test_batch_decode():
+    from protobuf_decoder import batch
+
+    messages = [bytes.fromhex(test_target) for test_target in (
+        "08 96 01 12 04 74 65 73 74",
+        "1a 03 08 96 01 25 00 00 80 3f 21 00 00 00 00 00 00 f0 3f",
+        "0a 06 c3 a9 c3 a9 c3 a9 0f ff",
+        "",
+    )] * 10
+    expected = [Parser().parse(message.hex()) for message in messages]
+
+    results = batch.decode_batch(messages, jobs=2, chunksize=3)
+    assert [result.to_dict() for result in results] == [result.to_dict() for result in expected]
+    assert [result.to_dict() for result in batch.decode_batch(messages, jobs=1)] == \
+        [result.to_dict() for result in expected]
+
+    buffer = b"".join(messages)
+    spans = [(0, 9), (28, 10)]
+    assert list(batch.decode_spans(buffer, spans, jobs=2)) == [expected[0], expected[2]]
+    assert list(batch.decode_spans(memoryview(buffer), spans, jobs=1)) == [expected[0], expected[2]]
+
+    results = batch.decode_batch(messages[:3], jobs=2, lazy_strings=True, track_offsets=True)
+    assert isinstance(results[2][0].data, LazyString)
+    assert results[1][0].offset == 0 and results[1][0].data[0].value_offset == 3
+
+    depth = 10000
+    message = bytes.fromhex("08 96 01")
+    for _ in range(depth):
+        message = b"\x0a" + _encode_varint(len(message)) + message
+    parsed_data = Parser(memoize_subtrees=True).parse(message.hex())
+    assert batch.deserialize(batch.serialize(parsed_data)).to_bytes() == message
+
+    recovered = Parser(recover=True).parse("08 01 0f 10 02")
+    assert batch.deserialize(batch.serialize(recovered)).skipped_ranges == [(2, 3)]
+
+
+def test_batch_decode_without_shared_memory(monkeypatch):
+    from protobuf_decoder import batch
+
+    # Python 3.7 has no multiprocessing.shared_memory
+    monkeypatch.setattr(batch, "shared_memory", None)
+    assert [result.to_dict() for result in batch.decode_batch([b"\x08\x01"], jobs=1)] == \
+        [Parser().parse("08 01").to_dict()]
+    with pytest.raises(ImportError):
+        batch.decode_batch([b"\x08\x01"], jobs=2)
+    with pytest.raises(ImportError):
+        list(batch.decode_spans(b"\x08\x01", [(0, 2)], jobs=2))
+
+
+@pytest.mark.parametrize("data, expected", [
+    # two-byte tag and varint
+    (b"\x80\x01\x96\x01", [dict(field=16, wire_type="varint", data=150)]),
+    # 10-byte varint
+    (b"\x08" + b"\xff" * 9 + b"\x01", [dict(field=1, wire_type="varint", data=2 ** 64 - 1)]),
+    # three-byte length
+    (b"\x0a\x80\x80\x01" + b"a" * 16384, [dict(field=1, wire_type="string", data="a" * 16384)]),
+    (b"\x08\x96", []),
+    (b"\x80\x80", []),
+    (b"\x09\x01\x02\x03", []),
+    (b"\x0d\x01\x00\x00\x00", [dict(field=1, wire_type="fixed32", data=1)]),
+])
+def test_parse_tag_and_varint_lengths(data, expected):
+    parsed_results = Parser().parse(data.hex())
+    results = [result.to_dict() for result in parsed_results.results]
+    for result in results:
+        if result["wire_type"] == "fixed32":
+            result["data"] = result["data"]["signed_int"]
+    assert results == expected
+    assert parsed_results.remain_data == (None if expected else " ".join(f"{byte:02x}" for byte in data))
+
+
+def test_field_path_parser():
+    values = []
+    parser = FieldPathParser()
+    parser.parse_paths(bytes.fromhex("08 96 01 1a 07 08 01 12 03 61 62 63 1a 03 08 96 01 0d 00 00 80 3f"),
+                       lambda *args: values.append(args))
+    assert [(path, wire_type, str(value)) for path, wire_type, value in values] == [
+        ("1", "varint", "150"),
+        ("3.1", "varint", "1"),
+        ("3.2", "string", "abc"),
+        ("3.1", "varint", "150"),
+        ("1", "fixed32", "Fixed32Value(int:1065353216, float:1.0)"),
+    ]
+
+    values = []
+    parser.parse_paths(memoryview(b"\x1a\x02\x08\x01\x10\x02"), lambda *args: values.append(args))
+    assert values == [("3.1", "varint", 1), ("2", "varint", 2)]
+
+    # a binary payload, a nested message with bytes left over and left over top-level bytes
+    values = []
+    parser.parse_paths(bytes.fromhex("0a 04 8f ff ff ff 10 01 1a 03 08 01 ff 0f"), lambda *args: values.append(args))
+    assert values == [
+        ("1.$remain", "remain_data", b"\x8f\xff\xff\xff"),
+        ("2", "varint", 1),
+        ("3.1", "varint", 1),
+        ("3.$remain", "remain_data", b"\xff"),
+        ("$remain", "remain_data", b"\x0f"),
+    ]
+
+    with pytest.raises(TypeError):
+        parser.parse_bytes(b"\x08\x01")
+    with pytest.raises(TypeError):
+        parser.parse("08 01")
+
+
+def test_decode_columnar():
+    from protobuf_decoder import columnar
+
+    payloads = [
+        bytes.fromhex("08 01 12 01 61 19 00 00 00 00 00 00 f0 3f"),
+        bytes.fromhex("08 02 08 03 22 02 08 07"),
+        b"",
+        bytes.fromhex("12 00 22 02 08 08 2a 01 62 2d 00 00 00 40"),
+        bytes.fromhex("28 05"),
+    ]
+    columns = columnar.decode_columnar(payloads, use_numpy=False)
+    assert list(columns) == ["1", "2", "3", "4.1", "5"]
+
+    column = columns["1"]
+    assert column.wire_type == "varint"
+    assert column.rows == array("Q", [0, 1, 1])
+    assert column.values == array("Q", [1, 2, 3])
+    assert column.to_list() == [1, [2, 3], None, None, None]
+
+    assert columns["2"].values == ["a", ""]
+    assert columns["2"].to_list() == ["a", None, None, "", None]
+    assert columns["3"].values == array("d", [1.0])
+    assert columns["4.1"].to_list() == [None, 7, None, 8, None]
+
+    column = columns["5"]
+    assert column.wire_type is None
+    assert list(column.rows) == [3, 3, 4]
+    assert column.values == ["b", 2.0, 5]
+
+    if columnar.numpy is None:
+        with pytest.raises(ImportError):
+            columnar.decode_columnar(payloads, use_numpy=True)
+
+    columns = columnar.decode_columnar([bytes.fromhex("0a 04 8f ff ff ff 10 01"), bytes.fromhex("10 02")],
+                                       use_numpy=False)
+    assert columns["1.$remain"].wire_type == "remain_data"
+    assert columns["1.$remain"].to_list() == [b"\x8f\xff\xff\xff", None]
+
+
+def test_decode_columnar_numpy():
+    numpy = pytest.importorskip("numpy")
+    from protobuf_decoder import columnar
+
+    columns = columnar.decode_columnar([bytes.fromhex("08 01 15 00 00 80 3f"), bytes.fromhex("08 02")])
+    assert columns["1"].values.dtype == numpy.uint64
+    assert columns["1"].rows.tolist() == [0, 1]
+    assert columns["2"].values.tolist() == [1.0]
+    assert columns["1"].to_list() == [1, 2]
+
+
+def test_field_path_parser_parse_flat():
+    message = "08 96 01 1a 05 08 01 12 01 61 1a 03 08 96 01 22 00 0d 00 00 80 3f 08 02 08 03"
+    flat = FieldPathParser().parse_flat(bytes.fromhex(message))
+    assert list(flat) == ["1", "3.1", "3.2", "3[1].1", "4"]
+    assert flat["1"][0] == 150
+    assert flat["1"][1].value == 1.0
+    assert flat["1"][2:] == [2, 3]
+    assert flat["3.1"] == 1
+    assert flat["3.2"] == "a"
+    assert flat["3[1].1"] == 150
+    assert flat["4"] == ""
+
+    # paths select the same fields as ParsedResults.find
+    message = "18 05 1a 02 08 01 1a 04 08 02 10 03 1a 05 08 04 08 05 ff"
+    flat = FieldPathParser().parse_flat(bytes.fromhex(message))
+    assert flat == {"3": 5, "3[1].1": 1, "3[2].1": 2, "3[2].2": 3, "3[3].1": [4, 5], "3[3].$remain": b"\xff"}
+    parsed_data = Parser().parse(message)
+    for path in ("3", "3[1].1", "3[2].1", "3[2].2", "3[3].1"):
+        value = flat[path][0] if isinstance(flat[path], list) else flat[path]
+        assert parsed_data.find(path).data == value
+    assert FieldPathParser().parse_flat(bytes.fromhex("0a 04 8f ff ff ff 10 01")) == \
+        {"1.$remain": b"\x8f\xff\xff\xff", "2": 1}
+
+    # left over bytes of the first field 1 and a scalar field 1 don't share a key
+    flat = FieldPathParser().parse_flat(bytes.fromhex("0a 01 ff 08 07 ff"))
+    assert flat == {"1.$remain": b"\xff", "1": 7, "$remain": b"\xff"}
+
+    assert FieldPathParser(lazy_strings=True).parse_flat(b"\x0a\x02hi") == {"1": LazyString(b"hi")}
+    assert FieldPathParser().parse_flat(b"") == {}
+    with pytest.raises(AssertionError):
+        FieldPathParser(strict=True).parse_flat(b"\x08")
+
+
+def test_deprecated_helpers():
+    from protobuf_decoder.protobuf_decoder import BytesBuffer, Fetcher, RemainChunkTransaction
+
+    with pytest.warns(DeprecationWarning):
+        buffer = BytesBuffer()
+    buffer.append(1)
+    assert list(buffer) == [1]
+
+    with pytest.warns(DeprecationWarning):
+        fetcher = Fetcher()
+    fetcher.fetch_64bits()
+    fetcher.fetch()
+    assert fetcher.has_next and fetcher.fetching_bits == 8
+
+    with pytest.warns(DeprecationWarning):
+        transaction = RemainChunkTransaction()
+    transaction.start()
+    transaction.consume_chunk(0x0f)
+    transaction.consume_chunk(0xff)
+    assert transaction.has_remain_data and transaction.remain_hex_string == "0f ff"
+    transaction.done()
+    assert transaction.is_done and not transaction.has_remain_data